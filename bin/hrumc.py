@@ -10,15 +10,23 @@ __version__ = '1.0.0'
 __author__ = 'Jim Hefferon jhefferon at smcvt.edu'
 __license__ = 'GPL 3'
 
-import sys, os, os.path, re, pprint, argparse, traceback, time
-import tempfile, shutil, glob
+import sys, os, os.path, re, pprint, argparse, traceback, time, signal
+import hashlib, json, base64, socket
+import tempfile, shutil, glob, select
+import ctypes, ctypes.util
 import subprocess
+import concurrent.futures, threading, contextlib
+import html, unicodedata
 
 DEFAULT_PROGRAM_NAME = "hrumc2016.tex"  # name of the conference program
 
 # Global variables spare me from putting them in the call of each fcn.
 VERBOSE = False
 DEBUG = False
+PROFILE = None  # a Profile, when timing the build
+TIMEOUT_SECS = 300  # default for how long one program run may take
+TIMEOUT = TIMEOUT_SECS  # seconds, or None for no limit
+_failures_lock = threading.Lock()
 
 class HRUMCException(Exception):
     pass
@@ -36,7 +44,13 @@ def error(s):
     sys.exit(10)
 
 LATEX_INCLUDE_FN = "abs"
-LATEX_TEMPLATE = r"""\documentclass[12pt]{article}
+OUTPUT_DIR_NAME = "output"  # the .pdf of each abstract, by default in the input dir
+FAILED_DIR_NAME = "failed"  # logs of the documents that failed, in the output dir
+SCRATCH_DIR_NAME = "tmp"  # default place for scratch space, in the 'input' directory
+CACHE_DIR_NAME = ".hrumccache"  # build cache, kept between runs
+INDEX_FN = "abstracts.json"  # metadata of the abstracts, in the cache dir
+INDEX_VERSION = 2  # change when parse_abstract changes what it finds
+LATEX_PDFCROP_TEMPLATE = r"""\documentclass[12pt]{article}
 \usepackage{cmap}
 \usepackage[utf8]{inputenc}
   \DeclareUnicodeCharacter{00A0}{~} %% no break space
@@ -77,6 +91,45 @@ LATEX_TEMPLATE = r"""\documentclass[12pt]{article}
 \end{document}
 """ % (LATEX_INCLUDE_FN,)
 
+# Made with LATEX_PDFCROP_TEMPLATE, an abstract is a page with a lot of
+# white space, which pdfcrop must cut off.  Instead, by default, the preview
+# package makes the page just the size of the abstract plus a border, as
+# pdfcrop --margins 12 does, so no more programs need to run.
+LATEX_TEMPLATE = LATEX_PDFCROP_TEMPLATE.split(r"\begin{document}")[0] + r"""\usepackage[active,tightpage]{preview}
+\setlength{\PreviewBorder}{12bp}
+\begin{document}
+\begin{preview}\input{%s}\end{preview}
+\end{document}
+""" % (LATEX_INCLUDE_FN,)
+
+# For LaTeX-ing many abstracts in one run: the same preamble, with each 
+# abstract a preview, and so a page of its own, and the page-to-file map 
+# written to jobname.pgs
+LATEX_BATCH_TEMPLATE_TOP = LATEX_TEMPLATE.split(r"\begin{document}")[0] + r"""
+\newwrite\hrumcmanifest
+\newcount\hrumcpage
+%% Start an abstract, which is the next page.
+%%  #1  Name of the file
+\newcommand{\hrumcstart}[1]{\global\advance\hrumcpage by 1
+  \immediate\write\hrumcmanifest{\the\hrumcpage\space #1}}
+\begin{document}
+\immediate\openout\hrumcmanifest=\jobname.pgs
+"""
+LATEX_BATCH_ABSTRACT = r"\hrumcstart{%s}\begin{preview}\input{%s}\end{preview}"
+
+# The same, for cropping with pdfcrop: each abstract starts a page
+LATEX_PDFCROP_BATCH_TEMPLATE_TOP = LATEX_PDFCROP_TEMPLATE.split(r"\begin{document}")[0] + r"""
+\newwrite\hrumcmanifest
+%% Start an abstract on a new page.  The write is not immediate so \thepage
+%% is the page that the abstract starts on.
+%%  #1  Name of the file
+\newcommand{\hrumcstart}[1]{\clearpage\thispagestyle{empty}%%
+  \write\hrumcmanifest{\thepage\space #1}}
+\begin{document}
+\immediate\openout\hrumcmanifest=\jobname.pgs
+"""
+LATEX_PDFCROP_BATCH_ABSTRACT = r"\hrumcstart{%s}\input{%s}"
+
 
 LATEX_ALL_TEMPLATE_TOP = r"""\documentclass[11pt]{article}
 \usepackage{cmap}
@@ -143,6 +196,14 @@ LATEX_ROOMS_TEMPLATE_TOP = r"""\documentclass[12pt]{article}
     \input{#2}
   \end{description}
 }
+%% In place of \at, for an abstract that could not be made
+\newcommand{\atmissing}[1]{%
+  \begin{description}[font=\normalfont,leftmargin=2em,labelwidth=0em,topsep=0ex plus 1pt] 
+    \RaggedRight
+    \item[\abstracttime{#1}]
+    \textit{The abstract is not available.}
+  \end{description}
+}
 \newcommand{\abstracttime}[1]{#1}
 % Times
 \newcommand{\timeformat}[2]{#1:#2}
@@ -254,6 +315,14 @@ For technology problems either grab a student volunteer in the hallway or dial e
     \input{#2}
   \end{description}
 }
+%% In place of \at, for an abstract that could not be made
+\newcommand{\atmissing}[1]{%
+  \begin{description}[font=\normalfont,leftmargin=2em,labelwidth=0em,topsep=0ex plus 1pt] 
+    \RaggedRight
+    \item[\abstracttime{#1}]
+    \textit{The abstract is not available.}
+  \end{description}
+}
 \newcommand{\abstracttime}[1]{#1}
 % Times
 \newcommand{\timeformat}[2]{#1:#2}
@@ -311,230 +380,2946 @@ For technology problems either grab a student volunteer in the hallway or dial e
 """
 
 
-def make_rooms(inputfn, filelist, outputfn="rooms"):
-    """Make the signs for the rooms.
-    Assumes this is run from the 'input' directory, holding all the .tex 
-    abstracts.
+# ===== Build cache
+# A .pdf made from a given abstract by a given template and TeX 
+# installation does not change, so we keep it under a key that is a hash of
+# those things and reuse it next time.
+
+_toolchain_version = None
+def toolchain_version():
+    """Return a string identifying the installed pdflatex and pdfcrop, so
+    that upgrading TeX invalidates the cache.
+    """
+    global _toolchain_version
+    if _toolchain_version is None:
+        lines = []
+        for cmd in (['pdflatex','--version'], ['pdfcrop','--version']):
+            try:
+                out = subprocess.run(cmd,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,universal_newlines=True).stdout
+                lines.append(out.strip().split("\n")[0])
+            except OSError:
+                lines.append(cmd[0]+" not found")
+        _toolchain_version = "\n".join(lines)
+    return _toolchain_version
+
+def cache_key(*parts):
+    """Return a hex hash of the parts, each a string or bytes.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        h.update(hashlib.sha256(part).digest())
+    return h.hexdigest()
+
+def file_key(fn, *parts):
+    """Return the cache key for the contents of file fn plus the parts.
+    """
+    f = open(fn,'rb')
+    contents = f.read()
+    f.close()
+    return cache_key(contents, *parts)
+
+def cache_fetch(cachedir, key, destfn):
+    """Copy the cached file with the given key to destfn.  Return True if
+    there was one.
+    """
+    if cachedir is None:
+        return False
+    cachedfn = os.path.join(cachedir, key)
+    if not(os.path.isfile(cachedfn)):
+        return False
+    shutil.copyfile(cachedfn, destfn)
+    os.utime(cachedfn)  # note that it was used
+    return True
+
+def cache_store(cachedir, key, srcfn):
+    """Put a copy of srcfn in the cache under the given key.
+    """
+    if cachedir is None:
+        return
+    os.makedirs(cachedir, exist_ok=True)
+    # copy then rename, so a reader never sees a partial file
+    fd, tmpfn = tempfile.mkstemp(dir=cachedir, prefix='.tmp')
+    os.close(fd)
+    shutil.copyfile(srcfn, tmpfn)
+    os.replace(tmpfn, os.path.join(cachedir, key))
+
+
+# ===== Precompiled formats
+# Loading the preamble is most of the time in LaTeX-ing a short document.
+# So we can dump each template's preamble into a format, named by a hash of
+# that preamble, and then LaTeX only the part from \begin{document} on.
+
+BEGIN_DOCUMENT = r"\begin{document}"
+_format_lock = threading.Lock()
+_format_failed = set()
+
+def latex_format(template, fmtdir):
+    """Return the name of a format in fmtdir holding the preamble of the
+    template, making the format if it is not already there.  Returns None
+    if the format cannot be made.
+    """
+    preamble = template.split(BEGIN_DOCUMENT)[0]
+    name = 'hrumc-'+cache_key(preamble, toolchain_version())[:16]
+    with _format_lock:
+        if os.path.isfile(os.path.join(fmtdir,name+'.fmt')):
+            return name
+        if name in _format_failed:
+            return None
+        if VERBOSE:
+            print("  Making the format",name+'.')
+        os.makedirs(fmtdir, exist_ok=True)
+        tmp_dir_name = tempfile.mkdtemp(prefix='tmp', dir=fmtdir)
+        try:
+            f = open(os.path.join(tmp_dir_name,name+'.tex'),'w')
+            f.write(preamble)
+            f.write("\n\\dump\n")
+            f.close()
+            try:
+                run_command(['pdflatex','-ini','-interaction=nonstopmode','-halt-on-error','-jobname='+name,'&pdflatex',name+'.tex'],cwd=tmp_dir_name,document=name,step='pdflatex -ini')
+            except HRUMCException as e:
+                warn(str(e))
+            if not(os.path.isfile(os.path.join(tmp_dir_name,name+'.fmt'))):
+                warn("unable to make the format "+name+"; LaTeX-ing without it")
+                _format_failed.add(name)
+                return None
+            os.replace(os.path.join(tmp_dir_name,name+'.fmt'), os.path.join(fmtdir,name+'.fmt'))
+        finally:
+            shutil.rmtree(tmp_dir_name)
+    return name
+
+def latex_source(template, fmtdir=None):
+    """Return the text to write for a document made from template, and the
+    name of the format to LaTeX it with.  If fmtdir is None, or the format
+    cannot be made, that is the whole template and None.
+    """
+    if fmtdir is not None:
+        fmt = latex_format(template, fmtdir)
+        if fmt is not None:
+            return BEGIN_DOCUMENT+template.split(BEGIN_DOCUMENT,1)[1], fmt
+    return template, None
+
+
+# ===== Running pdflatex
+# Like latexmk, we run pdflatex again only when the files that it reads back
+# on the next pass have changed, or when the log asks for it.
+
+MAX_LATEX_PASSES = 4  # give up on the files settling after this many
+LATEX_OPTIONS = ['-interaction=nonstopmode','-halt-on-error']  # never wait at a prompt
+LOG_EXCERPT_LINES = 12  # lines of a failed log to show
+RERUN_EXTENSIONS = ('.aux', '.toc', '.out')  # read back on the next pass
+AUX_IGNORE_RE = re.compile(r"\\relax\s*$|\\gdef\s*\\@abspage@last\{\d+\}\s*$")
+AUX_INPUT_RE = re.compile(r"\\@input\{([^\}]*)\}\s*$")
+PAGES_RE = re.compile(r"^Output written on .*\((\d+) pages?", re.M)
+RERUN_RE = re.compile(r"Rerun to get|Rerun LaTeX|Please rerun|Label\(s\) may have changed")  # not undefined references, which a missing label leaves for good
+
+def _read_for_rerun(fn, dirname, depth=0):
+    """Return the lines of fn that matter on the next pass.  Lines that
+    LaTeX writes even to an empty .aux are dropped, and an .aux that this
+    one inputs, as from an include, is replaced by its own lines.
+    """
+    lines = []
+    try:
+        f = open(os.path.join(dirname,fn),'r',errors='replace')
+    except OSError:
+        return lines  # a missing file is the same as an empty one
+    for line in f:
+        if AUX_IGNORE_RE.match(line):
+            continue
+        m = AUX_INPUT_RE.match(line)
+        if m and depth < 5:
+            lines.extend(_read_for_rerun(m.group(1), dirname, depth+1))
+        else:
+            lines.append(line)
+    f.close()
+    return lines
+
+def rerun_state(jobname, dirname):
+    """Return a hash of the files that pdflatex would read back in.
+    """
+    return cache_key(*["".join(_read_for_rerun(jobname+ext, dirname)) for ext in RERUN_EXTENSIONS])
+
+def rerun_requested(jobname, dirname):
+    """Return True if the .log asks for another pass.
+    """
+    try:
+        f = open(os.path.join(dirname,jobname+'.log'),'r',errors='replace')
+    except OSError:
+        return False
+    log = f.read()
+    f.close()
+    return RERUN_RE.search(log) is not None
+
+class LaTeXError(HRUMCException):
+    """pdflatex failed.  The log is the text of its .log file.
+    """
+    def __init__(self, message, log=''):
+        HRUMCException.__init__(self, message)
+        self.log = log
+
+def log_excerpt(log, n=LOG_EXCERPT_LINES):
+    """Return the lines of the TeX log text that tell what went wrong: each
+    error, starting with !, and the lines after it that show where.  If 
+    there are none, the last n lines.
+    """
+    lines = log.splitlines()
+    excerpt = []
+    for i, line in enumerate(lines):
+        if line.startswith('!'):
+            excerpt.extend(lines[i:i+3])
+    if not(excerpt):
+        excerpt = lines[-n:]
+    return excerpt[:n]
+
+def latex_error(jobname, dirname):
+    """Return a LaTeXError for the failed run of jobname in dirname.
+    """
+    try:
+        f = open(os.path.join(dirname,jobname+'.log'),'r',errors='replace')
+        log = f.read()
+        f.close()
+    except OSError:
+        log = ''
+    return LaTeXError("pdflatex failed on "+jobname+"\n    "+"\n    ".join(log_excerpt(log)), log)
+
+def run_pdflatex(jobname, dirname='.', maxpasses=MAX_LATEX_PASSES, fmt=None, fmtdir=None, texinputs=None):
+    """Run pdflatex on jobname in dirname as many times as it needs, but at
+    most maxpasses.  If fmt is not None, use that format, from fmtdir.  If
+    texinputs is not None, it is the TEXINPUTS to use.
+    Returns the number of passes.  Raises LaTeXError if pdflatex stops on
+    an error or makes no .pdf.
+    """
+    cmd, env = ['pdflatex']+LATEX_OPTIONS+[jobname], dict(os.environ)
+    if fmt is not None:
+        cmd = ['pdflatex']+LATEX_OPTIONS+['-fmt='+fmt,jobname]
+        env['TEXFORMATS'] = os.path.abspath(fmtdir)+os.pathsep  # then the usual places
+    if texinputs is not None:
+        env['TEXINPUTS'] = texinputs
+    passes = 0
+    while passes < maxpasses:
+        before = rerun_state(jobname, dirname)
+        passes += 1
+        returncode = run_command(cmd,cwd=dirname,env=env,document=jobname,step='pdflatex '+str(passes))
+        if returncode != 0 or not(os.path.isfile(os.path.join(dirname,jobname+'.pdf'))):
+            raise latex_error(jobname, dirname)
+        if (rerun_state(jobname, dirname) == before
+            and not(rerun_requested(jobname, dirname))):
+            break
+    else:
+        warn("LaTeX-ing "+jobname+" did not settle after "+str(maxpasses)+" passes")
+    if DEBUG:
+        print("DEBUG: pdflatex passes for "+jobname+":",passes)
+    if PROFILE is not None:
+        PROFILE.add_log(jobname, os.path.join(dirname,jobname+'.log'))
+    return passes
+
+
+def log_pages(logfn):
+    """Return the number of pages that the TeX log logfn says were written,
+    or None.
+    """
+    try:
+        f = open(logfn,'r',errors='replace')
+        m = PAGES_RE.search(f.read())
+        f.close()
+    except OSError:
+        return None
+    if m is None:
+        return None
+    return int(m.group(1))
+
+
+# ===== Profiling
+# With --profile we time each step of making each document, that is, each 
+# program that we run and each file that we copy, and we keep what the TeX
+# logs say about bad boxes, missing characters, and reruns.
+
+PROFILE_SUMMARY_LENGTH = 10  # how many of the slowest documents to show
+PROFILE_MAX_DIAGNOSTICS = 20  # lines of each kind kept from a log
+LOG_DIAGNOSTIC_RES = (  # searched for, so all but rerun are anchored
+    ('badbox', re.compile(r"^(Overfull|Underfull) \\[hv]box")),
+    ('missingchar', re.compile(r"^Missing character: ")),
+    ('rerun', RERUN_RE),
+    ('warning', re.compile(r"^(LaTeX|Package \S+|Class \S+) Warning: ")),
+    ('error', re.compile(r"^! ")),
+)
+
+class Profile(object):
+    """Times of the steps in making each document, and the diagnostics
+    from the TeX logs.  Safe to use from several threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.steps = {}  # document -> list of dicts
+        self.diagnostics = {}  # document -> kind -> list of lines
+
+    def add(self, document, step, wall, cpu):
+        with self.lock:
+            self.steps.setdefault(document, []).append(
+                {'step': step, 'wall': wall, 'cpu': cpu})
+
+    def add_log(self, document, logfn):
+        """Keep the interesting lines of the TeX log logfn.
+        """
+        try:
+            f = open(logfn,'r',errors='replace')
+        except OSError:
+            return
+        found = {}
+        for line in f:
+            for kind, regex in LOG_DIAGNOSTIC_RES:
+                if regex.search(line):
+                    found.setdefault(kind, []).append(line.rstrip())
+        f.close()
+        with self.lock:
+            d = self.diagnostics.setdefault(document, {})
+            for kind, lines in found.items():
+                d[kind] = lines[:PROFILE_MAX_DIAGNOSTICS]
+                d[kind+'_count'] = len(lines)
+
+    def totals(self):
+        """Return a list of (wall, cpu, document), slowest first.
+        """
+        with self.lock:
+            totals = [(sum(x['wall'] for x in steps), sum(x['cpu'] for x in steps), document)
+                      for document, steps in self.steps.items()]
+        totals.sort(reverse=True)
+        return totals
+
+    def report(self):
+        with self.lock:
+            return {'documents': dict((document, 
+                        {'wall': sum(x['wall'] for x in steps),
+                         'cpu': sum(x['cpu'] for x in steps),
+                         'steps': steps,
+                         'diagnostics': self.diagnostics.get(document, {})})
+                        for document, steps in self.steps.items())}
+
+    def write(self, fn):
+        fout = open(fn,'w')
+        json.dump(self.report(), fout, indent=2, sort_keys=True)
+        fout.close()
+
+    def summary(self, n=PROFILE_SUMMARY_LENGTH):
+        """Return lines giving the n slowest documents.
+        """
+        lines = ["Slowest documents (wall secs, cpu secs, bad boxes, missing chars):"]
+        for wall, cpu, document in self.totals()[:n]:
+            d = self.diagnostics.get(document, {})
+            lines.append("  %8.3f %8.3f %4d %4d  %s" % (wall, cpu, d.get('badbox_count',0), d.get('missingchar_count',0), document))
+        return lines
+
+@contextlib.contextmanager
+def profiled(document, step):
+    """Time the enclosed file operations, when profiling.
+    """
+    if PROFILE is None:
+        yield
+        return
+    start_wall, start_cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        PROFILE.add(document, step, time.perf_counter()-start_wall, time.thread_time()-start_cpu)
+
+def run_command(cmd, cwd=None, env=None, document=None, step=None):
+    """Run the command, discarding its output, and return its exit code.  
+    It gets no input, so it cannot wait at a prompt, and if it runs longer
+    than TIMEOUT seconds it is killed and HRUMCException is raised, as it
+    is if the command cannot be run at all.
+    When profiling, note its wall time and CPU time under document and step.
+    """
+    start_wall = time.perf_counter()
+    try:
+        p = subprocess.Popen(cmd,stdin=subprocess.DEVNULL,stdout=subprocess.DEVNULL,cwd=cwd,env=env)
+    except OSError as e:
+        raise HRUMCException("unable to run "+cmd[0]+" on "+(document or os.path.basename(cmd[-1]))+": "+str(e))
+    killed = []
+    def kill():
+        killed.append(True)
+        p.send_signal(signal.SIGKILL)
+    timer = None
+    if TIMEOUT:
+        timer = threading.Timer(TIMEOUT, kill)
+        timer.daemon = True
+        timer.start()
+    try:
+        # wait4 gives the CPU time of just this child, even with other threads
+        pid, status, rusage = os.wait4(p.pid, 0)
+    finally:
+        if timer is not None:
+            timer.cancel()
+    if os.WIFSIGNALED(status):
+        p.returncode = -os.WTERMSIG(status)
+    else:
+        p.returncode = os.WEXITSTATUS(status)
+    if PROFILE is not None:
+        PROFILE.add(document or os.path.basename(cmd[-1]), step or cmd[0],
+                    time.perf_counter()-start_wall, rusage.ru_utime+rusage.ru_stime)
+    if killed:
+        raise HRUMCException(cmd[0]+" on "+(document or os.path.basename(cmd[-1]))+" took more than "+str(TIMEOUT)+" seconds and was stopped")
+    return p.returncode
+
+def quarantine(document, e, faileddir=None, failures=None):
+    """Note that making the document failed, with the exception e, so the
+    rest of the build can go on.  If faileddir is not None, keep the TeX 
+    log there, if there is one.
+      failures  List to note it in, or None
+    """
+    if failures is not None:
+        with _failures_lock:
+            failures.append((document, str(e)))
+    warn("unable to make "+document+": "+str(e))
+    if faileddir is not None and getattr(e, 'log', ''):
+        os.makedirs(faileddir, exist_ok=True)
+        fout = open(os.path.join(faileddir,document+'.log'),'w')
+        fout.write(e.log)
+        fout.close()
+
+
+# ===== Abstract metadata
+# Each abstract file holds
+#   \abstract{title}{authors}{level}{subject}{body}
+# possibly with comments between and inside the arguments, and possibly 
+# followed by \notes{..}.  We read those without LaTeX, with a small 
+# tokenizer that knows about braces, control sequences, and comments, and 
+# keep what we find in an index so that questions like "which are the
+# Level 2 Statistics talks?" need no TeX run at all.
+
+ABSTRACT_FIELDS = ('title', 'authors', 'level', 'subject', 'body')
+TEX_TOKEN_RE = re.compile(r"(?P<cs>\\(?:[A-Za-z@]+|.))|(?P<open>\{)|(?P<close>\})|(?P<comment>%[^\n]*\n?[ \t]*)|(?P<text>[^\\{}%]+)", re.S)
+AUTHORREF_RE = re.compile(r"\\authorref\{([^\}]*)\}\{([^\}]*)\}")
+AFFILIATION_RE = re.compile(r"\\affiliation\{([^\}]*)\}")
+AUTHOR_SPLIT_RE = re.compile(r"\\\\|\\and\b|\band\b|;")
+
+def tex_tokens(text):
+    r"""Return a list of (kind, value, linenumber) for the TeX source text.
+    The kind is one of 'cs' (a control sequence such as \abstract or \%), 
+    'open' and 'close' (braces), 'comment', and 'text'.
+    """
+    tokens = []
+    linenumber = 1
+    for m in TEX_TOKEN_RE.finditer(text):
+        tokens.append((m.lastgroup, m.group(), linenumber))
+        linenumber += m.group().count("\n")
+    return tokens
+
+def read_group(tokens, i):
+    """Read a brace-delimited argument that starts at or after tokens[i], 
+    past any spaces and comments.  Returns the argument's text, without 
+    comments, and the index of the token after its closing brace.  Raises
+    HRUMCException if there is no argument or its braces do not balance.
+    """
+    while i < len(tokens) and (tokens[i][0] == 'comment' or (tokens[i][0] == 'text' and not(tokens[i][1].strip()))):
+        i += 1
+    if i >= len(tokens) or tokens[i][0] != 'open':
+        linenumber = tokens[min(i,len(tokens)-1)][2] if tokens else 1
+        raise HRUMCException("expected an argument in braces at line "+str(linenumber))
+    start_line = tokens[i][2]
+    depth, parts = 0, []
+    while i < len(tokens):
+        kind, value, linenumber = tokens[i]
+        i += 1
+        if kind == 'open':
+            depth += 1
+            if depth == 1:
+                continue
+        elif kind == 'close':
+            depth -= 1
+            if depth == 0:
+                return "".join(parts), i
+        elif kind == 'comment':
+            continue
+        parts.append(value)
+    raise HRUMCException("the argument starting at line "+str(start_line)+" has no closing brace")
+
+def plain_text(s):
+    r"""Return s with runs of spaces squeezed, and with \authorref and 
+    \affiliation written out, for searching.
+    """
+    s = AUTHORREF_RE.sub(r"\1 \2", s)
+    s = AFFILIATION_RE.sub(r"(\1)", s)
+    return " ".join(s.split())
+
+def speaker_names(authors):
+    r"""Return the list of names in the TeX source of the authors argument
+    of an abstract.  Names given by \authorref are used if there are any.
+    Otherwise the authors are split at \\, and, and semicolons.  In a 
+    part with affiliations in parentheses, as in "Steve Jones (UBC), Mark 
+    Smith (BCU)", each name comes before a parenthesis; in others, as in
+    "Steve Jones, UBC", the name is what comes before the first comma.
+    """
+    names = [first+" "+last for first, last in AUTHORREF_RE.findall(authors)]
+    if not(names):
+        for part in AUTHOR_SPLIT_RE.split(AFFILIATION_RE.sub(r"(\1)", authors)):
+            if '(' in part:
+                names.extend(m.group(1) for m in re.finditer(r"(?:^|\))[\s,]*([^(),]+?)\s*\(", part))
+            elif part.split(',')[0].strip():
+                names.append(part.split(',')[0])
+    return [" ".join(name.replace('~',' ').split()) for name in names]
+
+def read_abstract_fields(text):
+    r"""Return a dict of the TeX source of the arguments of the abstract in
+    the TeX source text, title, authors, level, subject, and body, and of 
+    notes, which is None if there is no \notes.  Raises HRUMCException if 
+    there is no well-formed \abstract.
+    """
+    tokens = tex_tokens(text)
+    for i, (kind, value, linenumber) in enumerate(tokens):
+        if kind == 'cs' and value == r"\abstract":
+            break
+    else:
+        raise HRUMCException("there is no \\abstract")
+    fields = {}
+    i += 1
+    for field in ABSTRACT_FIELDS:
+        try:
+            fields[field], i = read_group(tokens, i)
+        except HRUMCException as e:
+            raise HRUMCException("unable to read the "+field+" of the \\abstract: "+str(e))
+    fields['notes'] = None
+    while i < len(tokens):
+        if tokens[i][0] == 'cs' and tokens[i][1] == r"\notes":
+            fields['notes'], i = read_group(tokens, i+1)
+        else:
+            i += 1
+    return fields
+
+def parse_abstract(text):
+    r"""Return a dict of the fields of the abstract in the TeX source text: 
+    title, authors, speakers, level, subject, body_length, and notes.  Raises 
+    HRUMCException if there is no well-formed \abstract.
+    """
+    fields = read_abstract_fields(text)
+    return {'title': plain_text(fields['title']),
+            'authors': plain_text(fields['authors']),
+            'speakers': speaker_names(fields['authors']),
+            'level': plain_text(fields['level']),
+            'subject': plain_text(fields['subject']),
+            'body_length': len(plain_text(fields['body'])),
+            'notes': None if fields['notes'] is None else plain_text(fields['notes'])}
+
+def read_abstract_index(filelist, indexfn=None):
+    """Return a map from each abstract file in filelist to its metadata, 
+    from parse_abstract, plus key (the file name without .tex) and, if it 
+    could not be read, error.  If indexfn is not None, reuse what is there
+    for files whose modification time and size, or else contents, have not 
+    changed, and save the result there.
     """
-    starting_dir = os.getcwd()
-    # make a tmp dir
-    if os.path.isdir('tmp'):
-        shutil.rmtree('tmp')
-    os.mkdir('tmp')
-    tmp_dir_name = tempfile.mkdtemp(prefix='tmp', dir='tmp')
-    # copy all the .tex files to the tmp dir
+    old = {}
+    if indexfn is not None and os.path.isfile(indexfn):
+        try:
+            f = open(indexfn,'r')
+            d = json.load(f)
+            f.close()
+            if d.get('version') == INDEX_VERSION:
+                old = d.get('abstracts', {})
+        except ValueError:
+            warn("unable to read the index "+indexfn+"; making it again")
+    index, changed = {}, (len(old) != len(filelist))
     for fn in filelist:
-        shutil.copyfile(starting_dir+'/'+fn,tmp_dir_name+'/'+fn)
-    # go to the tmp dir
-    os.chdir(tmp_dir_name)
-    # regexes for reading the file
-    sessionhead_re = re.compile(r"\\sessionhead\{([^\}]*)\}.*")
-    session_re = re.compile(r"\\session\{([^\}]*)\}\{([^\}]*)\}\{([^\}]*)\}.*")
-    at_re = re.compile(r"\\at\{([^\}]*)\}\{([^\}]*)\}.*")
-    # There are two passes.  First we get the rooms, then we stuff the map
-    rooms = {}  # map room number -> list of strings 
-    # get the rooms
+        st = os.stat(fn)
+        entry = old.get(fn)
+        if entry and entry['mtime_ns'] == st.st_mtime_ns and entry['size'] == st.st_size:
+            index[fn] = entry
+            continue
+        changed = True
+        f = open(fn,'rb')
+        contents = f.read()
+        f.close()
+        key = cache_key(contents)
+        if entry and entry['hash'] == key:
+            entry = dict(entry)
+        else:
+            entry = {'key': os.path.splitext(os.path.basename(fn))[0]}
+            try:
+                entry.update(parse_abstract(contents.decode('utf-8',errors='replace')))
+            except HRUMCException as e:
+                entry['error'] = str(e)
+        entry.update({'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'hash': key})
+        index[fn] = entry
+    if indexfn is not None and changed:
+        os.makedirs(os.path.dirname(os.path.abspath(indexfn)), exist_ok=True)
+        fd, tmpfn = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(indexfn)), prefix='.tmp')
+        fout = os.fdopen(fd,'w')
+        json.dump({'version': INDEX_VERSION, 'abstracts': index}, fout, indent=1, sort_keys=True)
+        fout.close()
+        os.replace(tmpfn, indexfn)
+    return index
+
+def find_abstracts(index, criteria):
+    """Return the sorted files in the index whose metadata matches all of
+    criteria, a list of field=value strings.  The level must match 
+    exactly; other fields match if they contain the value, ignoring case.
+    """
+    tests = []
+    for criterion in criteria:
+        try:
+            field, value = criterion.split('=',1)
+        except ValueError:
+            raise HRUMCException("expected field=value, not "+criterion)
+        field, value = field.strip(), value.strip().lower()
+        if field not in ('key', 'title', 'authors', 'level', 'subject', 'notes'):
+            raise HRUMCException("unable to search on "+field)
+        tests.append((field, value))
+    found = []
+    for fn, entry in index.items():
+        for field, value in tests:
+            got = (entry.get(field) or '').lower()
+            if (got != value) if field == 'level' else (value not in got):
+                break
+        else:
+            found.append(fn)
+    found.sort()
+    return found
+
+
+# ===== The conference program
+# The parallel sessions part of the program file, between the BEGIN and END
+# PARALLEL SESSIONS lines, looks like this.
+#   \sessionhead{One}
+#   \session{Analysis}{JEM 389}{Andrew McIntyre}
+#   \at{\Ia}{vees}
+# We read it once into these classes, and everything that needs the 
+# schedule uses that.
+
+PARALLEL_SESSIONS_BEGIN = "% ===== BEGIN PARALLEL SESSIONS"
+PARALLEL_SESSIONS_END = "% ===== END PARALLEL SESSIONS"
+SESSIONHEAD_RE = re.compile(r"\\sessionhead\{([^\}]*)\}.*")
+SESSION_RE = re.compile(r"\\session\{([^\}]*)\}\{([^\}]*)\}\{([^\}]*)\}(.*)")
+RANK_RE = re.compile(r"%\s*(\d+)")  # guessed popularity, 1 is the most
+AT_RE = re.compile(r"\\at\{([^\}]*)\}\{([^\}]*)\}.*")
+
+class Talk(object):
+    r"""One \at line: a time slot, such as \Ia, and the abstract's file key.
+    """
+    def __init__(self, time, key, session, linenumber=None):
+        self.time = time
+        self.key = key
+        self.session = session
+        self.linenumber = linenumber
+
+    def to_dict(self):
+        return {'time': self.time, 'key': self.key, 'line': self.linenumber}
+
+class Session(object):
+    r"""One \session line, and the talks that follow it.  The rank is the
+    number in a comment at the end of the line, as in roomallocation.txt, 
+    giving the guessed popularity of the session, or None.
+    """
+    def __init__(self, name, room, chair, parallelsession, linenumber=None, rank=None):
+        self.name = name
+        self.room = room
+        self.chair = chair
+        self.parallelsession = parallelsession
+        self.linenumber = linenumber
+        self.rank = rank
+        self.talks = []
+
+    def to_dict(self):
+        return {'name': self.name, 'room': self.room, 'chair': self.chair,
+                'line': self.linenumber, 'rank': self.rank,
+                'talks': [t.to_dict() for t in self.talks]}
+
+class ParallelSession(object):
+    r"""One \sessionhead line, and the sessions that follow it.  The name
+    is None for sessions that come before any \sessionhead.
+    """
+    def __init__(self, name, linenumber=None):
+        self.name = name
+        self.linenumber = linenumber
+        self.sessions = []
+
+    def to_dict(self):
+        return {'name': self.name, 'line': self.linenumber,
+                'sessions': [s.to_dict() for s in self.sessions]}
+
+class Program(object):
+    r"""The parallel sessions of a conference program, with indexes.
+      rooms  List of rooms, in the order that they first appear
+      by_room  Map room -> list of Session
+      by_chair  Map chair -> list of Session
+      by_slot  Map time, such as \Ia, -> list of Talk
+      by_abstract  Map abstract key -> list of Talk
+    """
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.parallelsessions = []
+        self.rooms = []
+        self.by_room = {}
+        self.by_chair = {}
+        self.by_slot = {}
+        self.by_abstract = {}
+
+    def add_parallelsession(self, parallelsession):
+        self.parallelsessions.append(parallelsession)
+
+    def add_session(self, session):
+        if not(self.parallelsessions):
+            self.add_parallelsession(ParallelSession(None))
+        session.parallelsession = self.parallelsessions[-1]
+        session.parallelsession.sessions.append(session)
+        if session.room not in self.by_room:
+            self.rooms.append(session.room)
+            self.by_room[session.room] = []
+        self.by_room[session.room].append(session)
+        self.by_chair.setdefault(session.chair, []).append(session)
+
+    def add_talk(self, talk):
+        talk.session.talks.append(talk)
+        self.by_slot.setdefault(talk.time, []).append(talk)
+        self.by_abstract.setdefault(talk.key, []).append(talk)
+
+    def sessions(self):
+        """Return all sessions, in order.
+        """
+        return [s for ps in self.parallelsessions for s in ps.sessions]
+
+    def talks(self):
+        """Return all talks, in order.
+        """
+        return [t for s in self.sessions() for t in s.talks]
+
+    def to_dict(self):
+        return {'file': self.filename, 'rooms': self.rooms,
+                'parallelsessions': [ps.to_dict() for ps in self.parallelsessions]}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+def read_program(fn):
+    """Read the parallel sessions of the program file fn in a single pass.
+    Returns a Program.
+    """
     try:
-        fin = open(starting_dir+'/../'+inputfn,'r')
+        fin = open(fn,'r')
     except Exception as e:
-        raise HRUMCException("unable to make rooms; unable to open "+inputfn+": "+str(e))
-    state = "BEFORE_PARALLEL_SESSIONS"
+        raise HRUMCException("unable to open the program "+fn+": "+str(e))
+    program = Program(fn)
+    session = None
+    in_parallel_sessions = False
     linenumber = 0
     for line in fin:
         linenumber += 1
-        if state == "BEFORE_PARALLEL_SESSIONS":
-            if line.startswith("% ===== BEGIN PARALLEL SESSIONS"):
-                state = "IN_PARALLEL_SESSIONS"
-        elif state == "IN_PARALLEL_SESSIONS":
-            if line.startswith("\session{"): # contains a room name
-                m = session_re.match(line)
-                if m:
-                    rooms[m.group(2)]=[]
-                else:
-                    raise HRUMCException('Expected a match for line number '+str(linenumber)+', the line '+line)
-            elif line.startswith("% ===== END PARALLEL SESSIONS"):
-                state = "AFTER_PARALLEL_SESSIONS"
-        if state == "AFTER_PARALLEL_SESSIONS":
-            pass
+        if not(in_parallel_sessions):
+            if line.startswith(PARALLEL_SESSIONS_BEGIN):
+                in_parallel_sessions = True
+        elif line.startswith("\\sessionhead{"): # new parallel session
+            m = SESSIONHEAD_RE.match(line)
+            if not(m):
+                raise HRUMCException('Expected a match for line number '+str(linenumber)+', the session head line '+line)
+            program.add_parallelsession(ParallelSession(m.group(1), linenumber))
+            session = None
+        elif line.startswith("\\session{"): # contains a room name
+            m = SESSION_RE.match(line)
+            if not(m):
+                raise HRUMCException('Expected a match for line number '+str(linenumber)+', the session line '+line)
+            rank = RANK_RE.search(m.group(4))
+            session = Session(m.group(1), m.group(2), m.group(3), None, linenumber,
+                              rank=(None if rank is None else int(rank.group(1))))
+            program.add_session(session)
+        elif line.startswith("\\at{"):
+            m = AT_RE.match(line)
+            if not(m):
+                raise HRUMCException('Expected a match for line number '+str(linenumber)+', the at line '+line)
+            if session is None:
+                raise HRUMCException('Line number '+str(linenumber)+' is not in a session: '+line)
+            program.add_talk(Talk(m.group(1), m.group(2), session, linenumber))
+        elif line.startswith(PARALLEL_SESSIONS_END):
+            break
+        else:
+            pass  # blank line
     fin.close()
     if DEBUG:
-        print("DEBUG: first pass Rooms:",rooms)
-    chairs = {}
-    for k in rooms:
-        chairs[k] = rooms[k].copy()
-    # populate the rooms
-    fin = open(starting_dir+'/../'+inputfn,'r')
-    parallelsessionnumber = None
-    sessionname, sessionroom, sessionchair = None, None, None
-    attime, atabstract  =  None, None
-    state = "BEFORE_PARALLEL_SESSIONS"
-    linenumber = 0
-    for line in fin:
-        linenumber +=1
-        if state == "BEFORE_PARALLEL_SESSIONS":
-            if line.startswith("% ===== BEGIN PARALLEL SESSIONS"):
-                state = "IN_PARALLEL_SESSIONS"
-        elif state == "IN_PARALLEL_SESSIONS":
-            if line.startswith("\\sessionhead{"): # new parallel session
-                m = sessionhead_re.match(line)
-                if m:
-                    parallelsessionnumber = m.group(1)
-                    for k in rooms:
-                        rooms[k].append("\\sessionhead{"+parallelsessionnumber+"}")
-                        chairs[k].append("\\clearpage\\sessionhead{"+parallelsessionnumber+"}")
-                else:
-                    raise HRUMCException('Expected a match for the line number '+str(linenumber)+', session head line '+line)
-            elif line.startswith("\\session{"):
-                m = session_re.match(line)
-                if m:
-                    sessionname, sessionroom, sessionchair = m.group(1), m.group(2), m.group(3)
-                    rooms[sessionroom].append("\\session{%s}{%s}{%s}" % (sessionname,sessionroom,sessionchair))
-                    chairs[sessionroom].append("\\session{%s}{%s}{%s}\n" % (sessionname,sessionroom,sessionchair))
-                    chairs[sessionroom].append("\\instructions{%s}{%s}{%s}\n" % (sessionname,sessionroom,sessionchair))
-                else:
-                    raise HRUMCException('Expected a match for line number '+str(linenumber)+', the session line '+line)
-            elif line.startswith("\\at{"):
-                # print("line starts with at")
-                m = at_re.match(line)
-                if m:
-                    attime, atabstract = m.group(1), m.group(2)
-                    rooms[sessionroom].append(r"\at{%s}{%s}" % (attime,atabstract))
-                    chairs[sessionroom].append(r"\at{%s}{%s}" % (attime,atabstract))
+        print("DEBUG: Rooms:",program.rooms)
+    return program
+
+def at_line(talk, missing=()):
+    r"""Return the \at line of the talk, or a placeholder if its abstract
+    is in missing, a set of abstract keys that could not be made.
+    """
+    if talk.key in missing:
+        return r"\atmissing{%s}" % (talk.time,)
+    return r"\at{%s}{%s}" % (talk.time,talk.key)
+
+def room_lines(program, room, missing=()):
+    """Return the lines of the room sign for one room.  The abstracts in
+    missing are left out; see at_line.
+    """
+    lines = []
+    for ps in program.parallelsessions:
+        if ps.name is not None:
+            lines.append("\\sessionhead{"+ps.name+"}")
+        for s in ps.sessions:
+            if s.room == room:
+                lines.append("\\session{%s}{%s}{%s}" % (s.name,s.room,s.chair))
+                for t in s.talks:
+                    lines.append(at_line(t, missing))
+    return lines
+
+def chair_lines(program, room, missing=()):
+    """Return the lines of the chair instructions for one room.  The 
+    abstracts in missing are left out; see at_line.
+    """
+    lines = []
+    for ps in program.parallelsessions:
+        if ps.name is not None:
+            lines.append("\\clearpage\\sessionhead{"+ps.name+"}")
+        for s in ps.sessions:
+            if s.room == room:
+                lines.append("\\session{%s}{%s}{%s}\n" % (s.name,s.room,s.chair))
+                lines.append("\\instructions{%s}{%s}{%s}\n" % (s.name,s.room,s.chair))
+                for t in s.talks:
+                    lines.append(at_line(t, missing))
+    return lines
+
+
+# ===== Checking the schedule
+# Mistakes in the program, such as an \at for an abstract that does not
+# exist or a chair who is booked in two rooms at once, otherwise show up
+# only after everything is LaTeX-ed, or at the conference.  These checks 
+# use the Program's indexes and the abstract index, so they take no time.
+
+def person_key(name):
+    """Return the name of a speaker or chair in a form for comparing.
+    """
+    return " ".join(name.replace('~',' ').replace('.',' ').lower().split())
+
+def check_program(program, filelist, index=None):
+    """Check the schedule in program against the abstracts in filelist.
+    Returns a list of errors and a list of warnings, as strings.
+      index  Metadata of the abstracts, from read_abstract_index, giving 
+        the speakers; without it speakers are not checked
+    """
+    errors, warnings = [], []
+    where = lambda linenumber: program.filename+":"+str(linenumber)+": "
+    names = dict((os.path.basename(fn), fn) for fn in filelist)
+    # abstracts that are missing, or scheduled twice
+    for key, talks in program.by_abstract.items():
+        if key+'.tex' not in names:
+            for t in talks:
+                errors.append(where(t.linenumber)+"there is no abstract "+key+".tex")
+        if len(talks) > 1:
+            errors.append(where(talks[0].linenumber)+"the abstract "+key+" is scheduled more than once, also at line "
+                          +", ".join(str(t.linenumber) for t in talks[1:]))
+    for name in sorted(names):
+        if os.path.splitext(name)[0] not in program.by_abstract:
+            warnings.append(name+": the abstract is not in the program")
+    for ps in program.parallelsessions:
+        label = "" if ps.name is None else " in the parallel session "+ps.name
+        # rooms used twice
+        rooms = {}
+        for s in ps.sessions:
+            if s.room in rooms:
+                errors.append(where(s.linenumber)+"the room "+s.room+" is already used"+label+", at line "+str(rooms[s.room].linenumber))
+            else:
+                rooms[s.room] = s
+        # people in two rooms at once; a chair is there for the whole session
+        bookings = {}
+        for s in ps.sessions:
+            if s.chair.strip():
+                bookings.setdefault(person_key(s.chair), []).append((s.chair, s.room, None, s.linenumber))
+            if index is None:
+                continue
+            for t in s.talks:
+                for name in index.get(names.get(t.key+'.tex'), {}).get('speakers', []):
+                    bookings.setdefault(person_key(name), []).append((name, s.room, t.time, t.linenumber))
+        for person, booked in bookings.items():
+            for i, (name, room, time, linenumber) in enumerate(booked):
+                for other_name, other_room, other_time, other_linenumber in booked[:i]:
+                    if room != other_room and (time is None or other_time is None or time == other_time):
+                        errors.append(where(linenumber)+name+" is in "+room+" and, at the same time"+label+", in "+other_room+" at line "+str(other_linenumber))
+                        break
+    return errors, warnings
+
+# ===== Linting the abstracts
+# Most abstracts that fail to LaTeX have a simple mistake in the form of
+# \abstract{title}{authors}{level}{subject}{body}: braces that do not 
+# balance, an argument left out, or a stray & or %.  Those can be found 
+# from the tokens in much less time than a run of pdflatex takes.
+
+LINT_LEVELS = ('1', '2')
+LINT_FIELDS = ('title', 'authors', 'subject')  # short fields, that go into lists
+LINT_SPECIAL_RE = re.compile(r"[&_#]")  # must be escaped outside of math
+
+def lint_abstract(text, filename='abstract'):
+    r"""Check the TeX source text of an abstract for mistakes in its form.
+    Returns a list of errors, which would stop pdflatex or spoil the 
+    output, and a list of warnings, as strings.
+    """
+    errors, warnings = [], []
+    where = lambda linenumber: filename+":"+str(linenumber)+": "
+    tokens = tex_tokens(text)
+    # a % after text on the same line, as in 50% of, is likely a mistake 
+    # in the short fields; in the body it may well be a comment
+    percents = set()
+    for k in range(1, len(tokens)):
+        if (tokens[k][0] == 'comment' and tokens[k][1][1:].strip()
+            and tokens[k-1][0] == 'text' and tokens[k-1][1].rsplit("\n",1)[-1].strip()):
+            percents.add(k)
+    # braces
+    opens = []
+    for kind, value, linenumber in tokens:
+        if kind == 'open':
+            opens.append(linenumber)
+        elif kind == 'close':
+            if opens:
+                opens.pop()
+            else:
+                errors.append(where(linenumber)+"there is a } with no { to match it")
+    for linenumber in opens:
+        errors.append(where(linenumber)+"there is a { with no } to match it")
+    if errors and percents:
+        errors.extend(where(tokens[k][2])+"this % starts a comment; if it is a percent sign, write \\%" for k in sorted(percents))
+    if errors:
+        return errors, warnings  # the rest would only be confused
+    starts = [i for i, (kind, value, linenumber) in enumerate(tokens) if kind == 'cs' and value == r"\abstract"]
+    if not(starts):
+        errors.append(where(1)+"there is no \\abstract")
+        return errors, warnings
+    if len(starts) > 1:
+        errors.append(where(tokens[starts[1]][2])+"there is more than one \\abstract")
+    start = starts[0]
+    abstract_line = tokens[start][2]
+    # the five arguments
+    fields, first, i = {}, {}, start+1
+    for n, field in enumerate(ABSTRACT_FIELDS):
+        before = i
+        try:
+            fields[field], i = read_group(tokens, i)
+        except HRUMCException:
+            errors.append(where(abstract_line)+"the \\abstract has "+str(n)+" arguments; it needs "+str(len(ABSTRACT_FIELDS))+": "+", ".join(ABSTRACT_FIELDS))
+            return errors, warnings
+        while tokens[before][0] != 'open':
+            before += 1
+        first[field] = before
+        for k in sorted(percents):
+            if field in LINT_FIELDS and before < k < i:
+                errors.append(where(tokens[k][2])+"the "+field+" has a % that starts a comment; if it is a percent sign, write \\%")
+    # text outside of the macro, other than \notes
+    def outside(tokens, position):
+        for kind, value, linenumber in tokens:
+            if kind != 'comment' and not(kind == 'text' and not(value.strip())):
+                errors.append(where(linenumber)+"there is text "+position+" the \\abstract")
+                return
+    outside(tokens[:start], "before")
+    rest, k = [], i
+    while k < len(tokens):
+        if tokens[k][0] == 'cs' and tokens[k][1] == r"\notes":
+            try:
+                fields['notes'], k = read_group(tokens, k+1)
+                continue
+            except HRUMCException:
+                pass
+        if len(starts) > 1 and k == starts[1]:
+            break  # already noted
+        rest.append(tokens[k])
+        k += 1
+    outside(rest, "after")
+    # the fields
+    level = plain_text(fields['level'])
+    if level not in LINT_LEVELS:
+        warnings.append(where(tokens[first['level']][2])+"the level is '"+level+"'; it should be "+" or ".join(LINT_LEVELS))
+    if not(plain_text(fields['subject'])):
+        warnings.append(where(tokens[first['subject']][2])+"the subject is empty")
+    for field in LINT_FIELDS:
+        s = re.sub(r"\\(?:[A-Za-z@]+|.)", "", MATH_RE.sub("", fields[field]))
+        for c in sorted(set(LINT_SPECIAL_RE.findall(s))):
+            errors.append(where(tokens[first[field]][2])+"the "+field+" has a "+c+" that is not escaped; write \\"+c)
+    return errors, warnings
+
+def lint_file(fn):
+    """Lint the abstract in the file fn, as lint_abstract does.
+    """
+    try:
+        f = open(fn,'r',encoding='utf-8',errors='replace')
+        text = f.read()
+        f.close()
+    except OSError as e:
+        return [fn+": unable to read: "+str(e)], []
+    return lint_abstract(text, fn)
+
+# ===== Assigning rooms
+# Matching rooms to the sessions of each parallel session, as in 
+# roomallocation.txt, is an assignment problem: the most popular sessions
+# should get the biggest rooms.  We solve it for each parallel session with
+# the Hungarian algorithm, which takes time cubic in the number of rooms
+# rather than trying every one of the factorially many matchings.
+
+TABLE_LINE_RE = re.compile(r"^\s*(?:\d+\.)?\s*([^\\%]*?\S)\s+(\d+)\s*$")
+SERIES_RE = re.compile(r"\s+[IVX]+[a-z]?$")  # Statistics IIa is in the Statistics series
+
+def read_table(fn):
+    """Read a file of lines such as "3.   JEM 378 46", a name and a number, 
+    maybe after a number with a period, and return a list of (name, 
+    number).  Lines that are not like that are skipped.
+    """
+    try:
+        fin = open(fn,'r')
+    except Exception as e:
+        raise HRUMCException("unable to open "+fn+": "+str(e))
+    try:
+        lines = fin.readlines()
+    except (OSError, ValueError) as e:
+        raise HRUMCException("unable to read "+fn+": "+str(e))
+    finally:
+        fin.close()
+    table = []
+    for line in lines:
+        m = TABLE_LINE_RE.match(line)
+        if m:
+            table.append((m.group(1), int(m.group(2))))
+    return table
+
+def assignment(cost):
+    """Return, for each row of the matrix cost, the column assigned to it,
+    so that no two rows share a column and the total cost is least.  There 
+    must be at least as many columns as rows.  This is the Hungarian 
+    algorithm, with row and column potentials.
+    """
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    u, v = [0]*(n+1), [0]*(m+1)
+    p, way = [0]*(m+1), [0]*(m+1)  # p[j] is the row given column j, from 1
+    for i in range(1,n+1):
+        p[0], j0 = i, 0
+        minv, used = [float('inf')]*(m+1), [False]*(m+1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], float('inf'), 0
+            for j in range(1,m+1):
+                if not(used[j]):
+                    cur = cost[i0-1][j-1]-u[i0]-v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m+1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
                 else:
-                    raise HRUMCException('Expected a match for line number '+str(linenumber)+', the at line '+line)
-            elif line.startswith("% ===== END PARALLEL SESSIONS"):
-                state = "AFTER_PARALLEL_SESSIONS"
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:  # follow the augmenting path back
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    result = [None]*n
+    for j in range(1,m+1):
+        if p[j]:
+            result[p[j]-1] = j-1
+    return result
+
+def session_series(name):
+    """Return the name of the series that the session is in, such as 
+    Statistics for Statistics IIa.
+    """
+    return SERIES_RE.sub("", name.strip())
+
+def building(room):
+    """Return the building of a room, such as JEM for JEM 378.
+    """
+    return room.split()[0] if room.split() else room
+
+def assign_rooms(program, capacities, attendance=None, building_penalty=0):
+    """Assign a room to each session of each parallel session of program.
+    Returns a map from the line number of each session to its room.
+      capacities  List of (room, number of seats)
+      attendance  Map from session name to the number expected, or None;
+        sessions not in it use their rank, from the program's comments
+      building_penalty  How many seats a change of building counts for, 
+        for a session whose series was in another building in the parallel
+        session before
+    Each parallel session is solved in turn, so that it can see where the
+    one before put each series.  Between rooms that are as good, a session
+    keeps the room that it has.  Raises HRUMCException if no session of a
+    parallel session has an attendance or a rank, as then any assignment 
+    is as good as another.
+    """
+    rooms = [room for room, seats in capacities]
+    assigned, last_buildings = {}, {}
+    for ps in program.parallelsessions:
+        if len(ps.sessions) > len(rooms):
+            raise HRUMCException("the parallel session "+str(ps.name)+" has "+str(len(ps.sessions))+" sessions but there are only "+str(len(rooms))+" rooms")
+        if len(ps.sessions) > 1 and not(any((attendance is not None and s.name in attendance) or s.rank is not None for s in ps.sessions)):
+            raise HRUMCException("no session in the parallel session "+str(ps.name)+" has an attendance or a rank, so there is nothing to assign the rooms by; put ranks in the program, as in \\session{...}{...}{...} % 1, or give attendance with -e")
+        # bigger rooms are worth more to more popular sessions; the scale
+        # leaves room for keeping the current room to break ties, without 
+        # that ever outweighing a seat
+        scale = len(ps.sessions)+1
+        cost = []
+        for s in ps.sessions:
+            if attendance is not None and s.name in attendance:
+                popularity = attendance[s.name]
+            elif s.rank is not None:
+                popularity = len(ps.sessions)+1-s.rank
             else:
-                pass  # blank line
-        if state == "AFTER_PARALLEL_SESSIONS":
-            pass
-    fin.close()        
-    if DEBUG:
-        print("DEBUG: second pass Rooms:",rooms)
-    # Drop the temp dir
-    # shutil.rmtree('tmp')
-    # Make the output file
-    fout = open(outputfn+'.tex','w')
-    print(LATEX_ROOMS_TEMPLATE_TOP, file=fout)
-    for k in rooms:
-        print(r"\begin{room}{%s}" % (k,), file=fout)
-        print("\n".join(rooms[k]), file=fout)
-        print(r"\end{room}", file=fout)
-    print(r"\end{document}", file=fout)
-    fout.close()
-    fout = open(outputfn+'chair.tex','w')
-    print(LATEX_CHAIR_TEMPLATE, file=fout)
-    for k in rooms:
-        print(r"\begin{room}{%s}" % (k,), file=fout)
-        print("\n".join(chairs[k]), file=fout)
-        print(r"\end{room}", file=fout)
-    print(r"\end{document}", file=fout)
+                warn("no attendance or rank for the session "+s.name+"; giving it what is left")
+                popularity = 0
+            series_building = last_buildings.get(session_series(s.name))
+            row = []
+            for room, seats in capacities:
+                if series_building is not None and building(room) != series_building:
+                    seats -= building_penalty
+                row.append(-popularity*seats*scale-(1 if room == s.room else 0))
+            cost.append(row)
+        buildings = {}
+        for s, j in zip(ps.sessions, assignment(cost)):
+            assigned[s.linenumber] = rooms[j]
+            buildings[session_series(s.name)] = building(rooms[j])
+        last_buildings = buildings
+    return assigned
+
+def write_rooms(fn, assigned):
+    r"""Rewrite the program fn with the rooms in assigned, a map from the 
+    line number of a \session to its room.  The old file is kept as fn.bak.
+    """
+    fin = open(fn,'r')
+    lines = fin.readlines()
+    fin.close()
+    for linenumber, room in assigned.items():
+        line = lines[linenumber-1]
+        m = SESSION_RE.match(line)
+        lines[linenumber-1] = line[:m.start(2)]+room+line[m.end(2):]
+    shutil.copyfile(fn, fn+'.bak')
+    fout = open(fn,'w')
+    fout.write("".join(lines))
     fout.close()
-    # LaTeX the files
-    jobname = os.path.splitext(os.path.basename(outputfn))[0]
-    if VERBOSE:
-        print("  LaTeX-ing the file",jobname+'.')
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    shutil.copyfile(jobname+'.pdf',starting_dir+'/'+jobname+'.pdf')
-    jobname = os.path.splitext(os.path.basename(outputfn+'chair'))[0]
-    if VERBOSE:
-        print("  LaTeX-ing the file",jobname+'.')
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    shutil.copyfile(jobname+'.pdf',starting_dir+'/'+jobname+'.pdf')
-    # clean up
-    os.chdir(starting_dir)
-    shutil.rmtree('tmp')
-
-
-
-def latex_each(fn,pdfdirname="/output/"):
-    """Make a temp dir, copy the file to it, run latex there,
-    and copy the .pdf back
-    """
-    starting_dir = os.getcwd()
-    # make a tmp dir and go there
-    if os.path.isdir('tmp'):
-        shutil.rmtree('tmp')
-    os.mkdir('tmp')
-    tmp_dir_name = tempfile.mkdtemp(prefix='tmp', dir='tmp')
-    os.chdir(tmp_dir_name)
-    shutil.copyfile(starting_dir+'/'+fn,'./'+LATEX_INCLUDE_FN+'.tex')
-    # Write the template to the basename of the included file
+
+
+# ===== Scratch space
+# TeX runs in a scratch directory, which can be put somewhere fast and local
+# such as /dev/shm.  A build makes one area there and each document gets a
+# private directory in it.  The abstracts are not copied in; instead TeX 
+# finds them in the input directory through TEXINPUTS, or through a link.
+
+@contextlib.contextmanager
+def scratch_dir(scratchdir, prefix='tmp'):
+    """Make a private temp dir under scratchdir, and remove it afterward 
+    (along with scratchdir, if this made it and it is empty).
+    """
+    made_scratch = not(os.path.isdir(scratchdir))
+    os.makedirs(scratchdir, exist_ok=True)
+    tmp_dir_name = tempfile.mkdtemp(prefix=prefix, dir=scratchdir)
+    try:
+        yield tmp_dir_name
+    finally:
+        shutil.rmtree(tmp_dir_name)
+        if made_scratch:
+            try:
+                os.rmdir(scratchdir)
+            except OSError:
+                pass  # someone else is using it
+
+def texinputs(inputdir):
+    """Return a TEXINPUTS that looks in the current dir, then in inputdir,
+    then in the usual places.
+    """
+    return os.pathsep.join(['.', os.path.abspath(inputdir), ''])
+
+def link_or_copy(srcfn, destfn):
+    """Make destfn a symbolic link to srcfn, or a copy if links are not
+    possible here.
+    """
+    try:
+        os.symlink(os.path.abspath(srcfn), destfn)
+    except (OSError, NotImplementedError):
+        shutil.copyfile(srcfn, destfn)
+
+
+def include_jobname(name):
+    """Return the jobname to LaTeX the abstract name under, in a scratch dir
+    where the abstract itself is LATEX_INCLUDE_FN.tex.  That is name, unless
+    writing the template to name.tex would write over the abstract.
+    """
+    if name.lower() != LATEX_INCLUDE_FN.lower():
+        return name
+    return 'hrumc'+name
+
+
+def latex_document(jobname, source, pdffn, fmt=None, fmtdir=None, scratchdir=SCRATCH_DIR_NAME, inputdir='.'):
+    """Write the source to jobname.tex in a private temp dir, LaTeX it 
+    there, finding the abstracts in inputdir, and copy the .pdf to pdffn.
+      fmt  Format to LaTeX with, from latex_source, or None
+      fmtdir  Directory of precompiled formats
+      scratchdir  Directory under which to make the private temp dir
+    Returns the number of pages, or None if the log does not say.
+    """
+    with scratch_dir(scratchdir, prefix='tmp'+jobname) as tmp_dir_name:
+        f = open(os.path.join(tmp_dir_name,jobname+'.tex'),'w')
+        f.write(source)
+        f.close()
+        run_pdflatex(jobname,tmp_dir_name,fmt=fmt,fmtdir=fmtdir,texinputs=texinputs(inputdir))
+        with profiled(jobname,'copy out'):
+            shutil.copyfile(os.path.join(tmp_dir_name,jobname+'.pdf'),pdffn)
+        return log_pages(os.path.join(tmp_dir_name,jobname+'.log'))
+
+def room_source(template, lines, room, fmtdir=None):
+    """Return the LaTeX source of a document of rooms, and its format.
+      template  LATEX_ROOMS_TEMPLATE_TOP or LATEX_CHAIR_TEMPLATE
+      lines  Function returning a room's lines, room_lines or chair_lines
+      room  List of rooms to include
+    """
+    source, fmt = latex_source(template, fmtdir)
+    parts = [source]
+    for k in room:
+        parts.append(r"\begin{room}{%s}" % (k,))
+        parts.append("\n".join(lines(k)))
+        parts.append(r"\end{room}")
+    parts.append(r"\end{document}")
+    return "\n".join(parts)+"\n", fmt
+
+def make_rooms(inputfn, filelist, outputfn="rooms", program=None, fmtdir=None, scratchdir=SCRATCH_DIR_NAME, sharded=False, jobs=1, cachedir=None, inputdir=None, outputdir=None, missing=()):
+    """Make the signs for the rooms, and the instructions for the chairs.
+    The two documents are made at the same time.
+      inputfn  Name of the program file, in the directory above inputdir
+      filelist  List of all abstract .tex filenames
+      outputfn  Name of the output documents
+      program  The already-read Program, if there is one
+      fmtdir  Directory of precompiled formats, or None to not use them
+      scratchdir  Directory under which to make the private temp dirs
+      sharded  If True, LaTeX each room separately and put them together;
+        see make_rooms_sharded
+      jobs  Number of rooms to LaTeX at once, when sharded
+      cachedir  Directory of the build cache, or None, when sharded
+      inputdir  Directory of the abstracts; default: the current one
+      outputdir  Directory for the .pdf's; default: the current one
+      missing  Keys of abstracts to leave out, as they could not be made
+    """
+    inputdir = os.path.abspath(inputdir or os.getcwd())
+    outputdir = os.path.abspath(outputdir or os.getcwd())
+    if program is None:
+        program = read_program(inputdir+'/../'+inputfn)
+    if sharded:
+        return make_rooms_sharded(program, outputfn, fmtdir=fmtdir, scratchdir=scratchdir, jobs=jobs, cachedir=cachedir, inputdir=inputdir, outputdir=outputdir, missing=missing)
+    work = []
+    for jobname, template, lines in ((outputfn, LATEX_ROOMS_TEMPLATE_TOP, room_lines), 
+                                     (outputfn+'chair', LATEX_CHAIR_TEMPLATE, chair_lines)):
+        jobname = os.path.splitext(os.path.basename(jobname))[0]
+        source, fmt = room_source(template, lambda k, lines=lines: lines(program, k, missing), program.rooms, fmtdir)
+        work.append((jobname, source, fmt))
+    def one(w):
+        jobname, source, fmt = w
+        if VERBOSE:
+            print("  LaTeX-ing the file",jobname+'.')
+        return latex_document(jobname, source, os.path.join(outputdir,jobname+'.pdf'), fmt=fmt, fmtdir=fmtdir, scratchdir=scratchdir, inputdir=inputdir)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(work)) as pool:
+        list(pool.map(one, work))
+
+def make_rooms_sharded(program, outputfn="rooms", fmtdir=None, scratchdir=SCRATCH_DIR_NAME, jobs=1, cachedir=None, inputdir=None, outputdir=None, missing=()):
+    """Make the room signs and the chair instructions by LaTeX-ing each
+    room of each as its own small document, all in one pool of jobs 
+    workers, and then putting the pieces together with pdfunite.  Each 
+    piece is cached under a hash of its source and of the abstracts that it
+    inputs, so only the rooms that changed are LaTeX-ed again.
+    The abstracts are in inputdir, and the .pdf's go to outputdir; by 
+    default, the current directory.  The abstracts in missing are left out.
+    """
+    inputdir = os.path.abspath(inputdir or os.getcwd())
+    outputdir = os.path.abspath(outputdir or os.getcwd())
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if cachedir is not None:
+        cachedir = os.path.join(cachedir,'rooms')
+    # make the source of each piece, and its key
+    work, documents = [], []
+    for jobname, template, lines in ((outputfn, LATEX_ROOMS_TEMPLATE_TOP, room_lines), 
+                                     (outputfn+'chair', LATEX_CHAIR_TEMPLATE, chair_lines)):
+        jobname = os.path.splitext(os.path.basename(jobname))[0]
+        pieces = []
+        for n, k in enumerate(program.rooms):
+            source, fmt = room_source(template, lambda k: lines(program, k, missing), [k], fmtdir)
+            abstracts = []
+            for s in program.by_room[k]:
+                for t in s.talks:
+                    if t.key in missing:
+                        continue
+                    try:
+                        f = open(os.path.join(inputdir,t.key+'.tex'),'rb')
+                        abstracts.append(f.read())
+                        f.close()
+                    except OSError:
+                        abstracts.append(b'')  # LaTeX will complain
+            key = cache_key(source, toolchain_version(), *abstracts)
+            piece = (jobname+'-'+str(n), source, fmt, key)
+            pieces.append(piece)
+            work.append(piece)
+        documents.append((jobname, pieces))
+    with scratch_dir(scratchdir, prefix='tmp'+outputfn) as tmp_dir_name:
+        def one(piece):
+            piecename, source, fmt, key = piece
+            pdffn = os.path.join(tmp_dir_name,piecename+'.pdf')
+            with profiled(piecename,'cache'):
+                found = cache_fetch(cachedir, key, pdffn)
+            if found:
+                return True
+            if VERBOSE:
+                print("  LaTeX-ing the room",piecename+'.')
+            latex_document(piecename, source, pdffn, fmt=fmt, fmtdir=fmtdir, scratchdir=tmp_dir_name, inputdir=inputdir)
+            cache_store(cachedir, key, pdffn)
+            return False
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1,jobs)) as pool:
+            hits = list(pool.map(one, work))
+        if VERBOSE and cachedir is not None:
+            print("  Room cache: "+str(sum(hits))+" hits, "+str(len(hits)-sum(hits))+" misses.")
+        # put the pieces together
+        for jobname, pieces in documents:
+            pdffns = [os.path.join(tmp_dir_name,piece[0]+'.pdf') for piece in pieces]
+            pdffn = os.path.join(outputdir,jobname+'.pdf')
+            if len(pdffns) == 1:
+                shutil.copyfile(pdffns[0], pdffn)
+            else:
+                unite(pdffns, pdffn, document=jobname)
+
+
+def crop(jobname, dirname):
+    """Crop jobname.pdf in dirname to jobname-crop.pdf.  Raises 
+    HRUMCException if that fails.
+    """
+    returncode = run_command(['pdfcrop','--margins','12',jobname+'.pdf'],cwd=dirname,document=jobname)
+    if returncode != 0 or not(os.path.isfile(os.path.join(dirname,jobname+'-crop.pdf'))):
+        raise HRUMCException("pdfcrop failed on "+jobname)
+
+def unite(pdffns, pdffn, document=None):
+    """Put the .pdf's in pdffns together, in order, into pdffn.  Raises 
+    HRUMCException if that fails.
+    """
+    # to a new name then a rename, so an old pdffn does not look like success
+    tmpfn = os.path.abspath(pdffn)+'.tmp'
+    returncode = run_command(['pdfunite']+[os.path.abspath(fn) for fn in pdffns]+[tmpfn],document=document)
+    if returncode != 0 or not(os.path.isfile(tmpfn)):
+        try:
+            os.remove(tmpfn)
+        except OSError:
+            pass
+        raise HRUMCException("pdfunite failed on "+(document or os.path.basename(pdffn)))
+    os.replace(tmpfn, pdffn)
+
+def latex_each(fn,pdfdirname="/output/",scratchdir=SCRATCH_DIR_NAME,fmtdir=None,pdfcrop=False):
+    """Make a private temp dir under scratchdir, link the file into it, run 
+    latex there, and copy the .pdf back.  It does not change the working 
+    directory, so a number of these can run at the same time.
+      fn  Name of the abstract .tex file
+      pdfdirname  Directory to hold the output .pdf
+      scratchdir  Directory under which to make the private temp dir
+      fmtdir  Directory of precompiled formats, or None to not use them
+      pdfcrop  If True, use LATEX_PDFCROP_TEMPLATE and crop with pdfcrop
+        instead of with the preview package
+    Returns the name of the output .pdf.
+    """
     jobname = os.path.splitext(os.path.basename(fn))[0]
-    if VERBOSE:
-        print("  LaTeX-ing the file",jobname+'.')
-    f = open(jobname+'.tex','w')
-    f.write(LATEX_TEMPLATE)
-    f.close()
-    # run pdflatex
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    subprocess.call(['pdfcrop','--margins','12',jobname+'.pdf'],stdout=subprocess.DEVNULL)
-    # subprocess.call(['dvips','-E',jobname+'.dvi','-o',jobname+'.eps'],stdout=subprocess.DEVNULL)
-    # subprocess.call(['ps2pdf',jobname+'.eps', jobname+'.pdf'],stdout=subprocess.DEVNULL)
-    shutil.copyfile('./'+jobname+'-crop.pdf', pdfdirname+'/'+jobname+'.pdf')
-    # clean up
-    os.chdir(starting_dir)
-    shutil.rmtree('tmp')
-
-
-def latex_all(jobname, filelist):
+    texname = include_jobname(jobname)
+    with scratch_dir(scratchdir, prefix='tmp'+jobname) as tmp_dir_name:
+        link_or_copy(fn,os.path.join(tmp_dir_name,LATEX_INCLUDE_FN+'.tex'))
+        # Write the template to the basename of the included file; 'x' so
+        # that it can never write through the link to the abstract
+        if VERBOSE:
+            print("  LaTeX-ing the file",jobname+'.')
+        source, fmt = latex_source(LATEX_PDFCROP_TEMPLATE if pdfcrop else LATEX_TEMPLATE, fmtdir)
+        f = open(os.path.join(tmp_dir_name,texname+'.tex'),'x')
+        f.write(source)
+        f.close()
+        # run pdflatex
+        run_pdflatex(texname,tmp_dir_name,fmt=fmt,fmtdir=fmtdir)
+        pdfname = texname+'.pdf'
+        if pdfcrop:
+            crop(texname,tmp_dir_name)
+            pdfname = texname+'-crop.pdf'
+        # subprocess.call(['dvips','-E',jobname+'.dvi','-o',jobname+'.eps'],stdout=subprocess.DEVNULL)
+        # subprocess.call(['ps2pdf',jobname+'.eps', jobname+'.pdf'],stdout=subprocess.DEVNULL)
+        pdffn = os.path.join(pdfdirname,jobname+'.pdf')
+        with profiled(jobname,'copy out'):
+            shutil.copyfile(os.path.join(tmp_dir_name,pdfname), pdffn)
+    return pdffn
+
+
+def latex_batch(filelist,pdfdirname="/output/",scratchdir=SCRATCH_DIR_NAME,fmtdir=None,pdfcrop=False):
+    """LaTeX many abstracts in a single run, each on its own page(s), then 
+    split that document into one .pdf per abstract, as latex_each would 
+    make.  That way pdflatex starts, and loads the preamble, only once.
+      filelist  List of abstract .tex filenames
+      pdfdirname  Directory to hold the output .pdf's
+      scratchdir  Directory under which to make the private temp dir
+      fmtdir  Directory of precompiled formats, or None to not use them
+      pdfcrop  If True, crop the document with pdfcrop before splitting 
+        it, as latex_each does
+    Returns the list of output .pdf names, in the order of filelist.
+    """
+    jobname = 'hrumcbatch'
+    with scratch_dir(scratchdir, prefix='tmp'+jobname) as tmp_dir_name:
+        # link the abstracts in, giving each a distinct name
+        source, fmt = latex_source(LATEX_PDFCROP_BATCH_TEMPLATE_TOP if pdfcrop else LATEX_BATCH_TEMPLATE_TOP, fmtdir)
+        f = open(os.path.join(tmp_dir_name,jobname+'.tex'),'w')
+        f.write(source)
+        names = []
+        for n, fn in enumerate(filelist):
+            name = os.path.splitext(os.path.basename(fn))[0]
+            names.append(name)
+            absfn = LATEX_INCLUDE_FN+str(n)
+            link_or_copy(fn,os.path.join(tmp_dir_name,absfn+'.tex'))
+            print((LATEX_PDFCROP_BATCH_ABSTRACT if pdfcrop else LATEX_BATCH_ABSTRACT) % (name, absfn), file=f)
+        print(r"\end{document}", file=f)
+        f.close()
+        if VERBOSE:
+            print("  LaTeX-ing",len(filelist),"abstracts in one batch.")
+        run_pdflatex(jobname,tmp_dir_name,fmt=fmt,fmtdir=fmtdir)
+        pdfname = jobname+'.pdf'
+        if pdfcrop:
+            crop(jobname,tmp_dir_name)
+            pdfname = jobname+'-crop.pdf'
+        # read the manifest: the first page of each abstract
+        firstpage = {}
+        try:
+            f = open(os.path.join(tmp_dir_name,jobname+'.pgs'),'r')
+            for line in f:
+                pagenumber, name = line.split(None,1)
+                firstpage[name.strip()] = int(pagenumber)
+            f.close()
+        except (OSError, ValueError) as e:
+            raise HRUMCException("unable to read the pages of the batch of abstracts: "+str(e))
+        # split into pages, and put each abstract's pages together
+        returncode = run_command(['pdfseparate',pdfname,'page-%d.pdf'],cwd=tmp_dir_name,document=jobname)
+        lastpage = len(glob.glob(os.path.join(tmp_dir_name,'page-*.pdf')))
+        if returncode != 0 or lastpage < max(firstpage.values() or [1]):
+            raise HRUMCException("pdfseparate failed on the batch of abstracts")
+        pdffns = []
+        for n, name in enumerate(names):
+            try:
+                start = firstpage[name]
+            except KeyError:
+                raise HRUMCException("unable to find the page of "+name+" in the batch of abstracts")
+            if n+1 < len(names):
+                end = firstpage[names[n+1]]-1
+            else:
+                end = lastpage
+            pages = [os.path.join(tmp_dir_name,'page-%d.pdf' % (i,)) for i in range(start,end+1)]
+            pdffn = os.path.join(pdfdirname,name+'.pdf')
+            if len(pages) == 1:
+                with profiled(name,'copy out'):
+                    shutil.copyfile(pages[0], pdffn)
+            else:
+                unite(pages, pdffn, document=name)
+            pdffns.append(pdffn)
+    return pdffns
+
+
+def latex_each_all(filelist,pdfdirname="/output/",jobs=1,cachedir=None,batch=False,fmtdir=None,scratchdir=SCRATCH_DIR_NAME,failures=None,pdfcrop=False):
+    """Run latex_each on every file, using a pool of jobs workers.
+      filelist  List of all abstract .tex filenames
+      pdfdirname  Directory to hold the output .pdf's
+      jobs  Number of abstracts to LaTeX at once; 0 means one per CPU
+      cachedir  Directory of the build cache, or None to not use one
+      batch  If True, use latex_batch instead, splitting the abstracts into
+        one batch per worker
+      fmtdir  Directory of precompiled formats, or None to not use them
+      scratchdir  Directory under which to make the private temp dirs
+      failures  List to note the failures in, as quarantine does
+      pdfcrop  If True, crop with pdfcrop, as in latex_each
+    Returns the list of output .pdf names, in the order of filelist.  An
+    abstract that cannot be made is left out, and quarantined with its log
+    in FAILED_DIR_NAME in pdfdirname.
+    """
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    # Take what we can from the cache
+    if cachedir is not None:
+        cachedir = os.path.join(cachedir,'each')
+    pdffns, keys, todo = {}, {}, []
+    for fn in filelist:
+        jobname = os.path.splitext(os.path.basename(fn))[0]
+        pdffn = os.path.join(pdfdirname,jobname+'.pdf')
+        if cachedir is not None:
+            keys[fn] = file_key(fn, LATEX_PDFCROP_TEMPLATE if pdfcrop else LATEX_TEMPLATE, toolchain_version())
+        with profiled(jobname,'cache'):
+            found = cache_fetch(cachedir, keys.get(fn), pdffn)
+        if found:
+            pdffns[fn] = pdffn
+        else:
+            todo.append(fn)
+    if VERBOSE and cachedir is not None:
+        print("  Cache: "+str(len(pdffns))+" hits, "+str(len(todo))+" misses.")
+    if VERBOSE and jobs > 1 and todo:
+        print("  LaTeX-ing",len(todo),"abstracts,",jobs,"at a time.")
+    faileddir = os.path.join(pdfdirname,FAILED_DIR_NAME)
+    def one(fn):
+        try:
+            pdffn = latex_each(fn,pdfdirname=pdfdirname,fmtdir=fmtdir,scratchdir=scratchdir,pdfcrop=pdfcrop)
+        except HRUMCException as e:
+            quarantine(os.path.splitext(os.path.basename(fn))[0], e, faileddir, failures)
+            return None
+        if cachedir is not None:
+            cache_store(cachedir, keys[fn], pdffn)
+        return pdffn
+    def one_batch(fns):
+        try:
+            made = latex_batch(fns,pdfdirname=pdfdirname,fmtdir=fmtdir,scratchdir=scratchdir,pdfcrop=pdfcrop)
+        except HRUMCException as e:
+            # find the bad ones by doing this batch one at a time
+            if VERBOSE:
+                print("  A batch failed, so LaTeX-ing its",len(fns),"abstracts one at a time.")
+            return [one(fn) for fn in fns]
+        if cachedir is not None:
+            for fn, pdffn in zip(fns, made):
+                cache_store(cachedir, keys[fn], pdffn)
+        return made
+    # make the scratch dir here, so the workers do not race to remove it
+    made_scratch = not(os.path.isdir(scratchdir))
+    os.makedirs(scratchdir, exist_ok=True)
+    try:
+        if batch:
+            # deal the files into one batch per worker, keeping them in order
+            size = max(1, -(-len(todo) // jobs))  # round up
+            batches = [todo[i:i+size] for i in range(0, len(todo), size)]
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+                made = [pdffn for pdffns_made in pool.map(one_batch, batches) for pdffn in pdffns_made]
+        elif jobs <= 1:
+            made = [one(fn) for fn in todo]
+        else:
+            # Threads are enough; the work happens in the pdflatex processes
+            with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+                made = list(pool.map(one, todo))
+    finally:
+        if made_scratch:
+            shutil.rmtree(scratchdir)
+    pdffns.update((fn, pdffn) for fn, pdffn in zip(todo, made) if pdffn is not None)
+    return [pdffns[fn] for fn in filelist if fn in pdffns]
+
+
+SORT_FIELDS = ('filename', 'subject', 'level')
+ALL_SHARD_SIZE = 20  # most abstracts in one piece of the all-abstracts document
+PAGES_FN = "pages.json"  # pages in each piece, in the cache dir
+
+def sort_abstracts(filelist, index, sortby='filename'):
+    """Return the filelist sorted by sortby, one of SORT_FIELDS, and then
+    by file name.  Abstracts whose field could not be read go last.
+      index  Map from file name to metadata, from read_abstract_index
+    """
+    if sortby not in SORT_FIELDS:
+        raise HRUMCException("unable to sort on "+sortby+"; the choices are "+", ".join(SORT_FIELDS))
+    if sortby == 'filename':
+        return sorted(filelist)
+    def key(fn):
+        value = index.get(fn, {}).get(sortby)
+        return (value is None, (value or '').lower(), fn)
+    return sorted(filelist, key=key)
+
+def all_shards(filelist, index, sortby='filename', size=ALL_SHARD_SIZE):
+    """Return the sorted filelist split into pieces, as a list of lists.
+    Sorted by subject or level, each subject or level starts a new piece.
+    No piece has more than size abstracts.
+    """
+    groups = []
+    last = None
+    for fn in sort_abstracts(filelist, index, sortby):
+        value = None if sortby == 'filename' else (index.get(fn, {}).get(sortby) or '').lower()
+        if not(groups) or value != last or len(groups[-1]) >= size:
+            groups.append([])
+        groups[-1].append(fn)
+        last = value
+    return groups
+
+def all_source(filelist, fmtdir=None, firstpage=1):
+    """Return the LaTeX source of a document of the abstracts in filelist,
+    with the first page numbered firstpage, and its format.
+    """
+    source, fmt = latex_source(LATEX_ALL_TEMPLATE_TOP, fmtdir)
+    parts = [source]
+    if firstpage != 1:
+        parts.append(r"\setcounter{page}{%d}" % (firstpage,))
+    for fn in filelist:
+        name = os.path.basename(fn)  # found through TEXINPUTS
+        parts.append(r"\medskip\par\noindent\llap{%s:\ }\input{%s}" % (name, name))
+    parts.append(r"\end{document}")
+    return "\n".join(parts)+"\n", fmt
+
+def latex_all(jobname, filelist, fmtdir=None, scratchdir=SCRATCH_DIR_NAME, sortby='filename', index=None, sharded=False, jobs=1, cachedir=None, inputdir=None, outputdir=None):
     """Make a single .pdf that contains all abstracts.
       jobname  Name of .pdf file
       filelist  List of all abstract .tex filenames
+      fmtdir  Directory of precompiled formats, or None to not use them
+      scratchdir  Directory under which to make the private temp dir
+      sortby  Order of the abstracts, one of SORT_FIELDS
+      index  Metadata of the abstracts, from read_abstract_index, or None
+        to read it here if sortby needs it
+      sharded  If True, LaTeX the document in pieces and put them 
+        together; see latex_all_sharded
+      jobs  Number of pieces to LaTeX at once, when sharded
+      cachedir  Directory of the build cache, or None, when sharded
+      inputdir  Directory of the abstracts; default: the current one
+      outputdir  Directory for the .pdf; default: the current one
     """
-    starting_dir = os.getcwd()
-    # make a tmp dir
-    if os.path.isdir('tmp'):
-        shutil.rmtree('tmp')
-    os.mkdir('tmp')
-    tmp_dir_name = tempfile.mkdtemp(prefix='tmp', dir='tmp')
-    # copy all the .tex files to the tmp dir
-    for fn in filelist:
-        shutil.copyfile(starting_dir+'/'+fn,tmp_dir_name+'/'+fn)
-    # go to the tmp dir
-    os.chdir(tmp_dir_name)
+    inputdir = os.path.abspath(inputdir or os.getcwd())
+    outputdir = os.path.abspath(outputdir or os.getcwd())
+    if index is None and sortby != 'filename':
+        paths = [os.path.join(inputdir,fn) for fn in filelist]
+        found = read_abstract_index(paths)
+        index = dict((fn, found[path]) for fn, path in zip(filelist, paths))
+    if sharded:
+        return latex_all_sharded(jobname, all_shards(filelist, index, sortby), fmtdir=fmtdir, scratchdir=scratchdir, jobs=jobs, cachedir=cachedir, inputdir=inputdir, outputdir=outputdir)
     # Write the template and include all the .tex files
-    f = open(jobname+'.tex','w')
-    f.write(LATEX_ALL_TEMPLATE_TOP)
-    for fn in filelist:
-        print(r"\medskip\par\noindent\llap{%s:\ }\input{%s}" % (fn, fn),file=f)
-    print(r"\end{document}",file=f)
-    f.close()
+    source, fmt = all_source(sort_abstracts(filelist, index, sortby), fmtdir)
     if VERBOSE:
         print("  LaTeX-ing the file of all abstracts: ",jobname+'.')
-    # run pdflatex
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    subprocess.call(['pdflatex',jobname],stdout=subprocess.DEVNULL)
-    shutil.copyfile('./'+jobname+'.pdf', starting_dir+'/'+jobname+'.pdf')
-    # clean up
-    os.chdir(starting_dir)
-    shutil.rmtree('tmp')
+    latex_document(jobname, source, os.path.join(outputdir,jobname+'.pdf'), fmt=fmt, fmtdir=fmtdir, scratchdir=scratchdir, inputdir=inputdir)
 
+def latex_all_sharded(jobname, shards, fmtdir=None, scratchdir=SCRATCH_DIR_NAME, jobs=1, cachedir=None, inputdir=None, outputdir=None):
+    """Make the document of all abstracts by LaTeX-ing each of the shards,
+    lists of abstract file names, as its own document, jobs at a time, and
+    then putting the pieces together with pdfunite.  Each piece starts on a
+    new page.
+    The page numbers run on from piece to piece, so a piece's first page 
+    depends on the lengths of those before it.  The length of each piece 
+    from the last build is kept in the cache, and the pieces are LaTeX-ed
+    with the first pages that those give.  Any piece whose guess turns out
+    wrong is LaTeX-ed again, so only a change in the length of a piece 
+    costs more than that one piece.  Pieces are cached under a hash of 
+    their source and of the abstracts, as the rooms are.
+    The abstracts are in inputdir, and the .pdf goes to outputdir; by 
+    default, the current directory.
+    """
+    inputdir = os.path.abspath(inputdir or os.getcwd())
+    outputdir = os.path.abspath(outputdir or os.getcwd())
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if cachedir is not None:
+        cachedir = os.path.join(cachedir,'all')
+    pagesfn = None if cachedir is None else os.path.join(cachedir,PAGES_FN)
+    known = {}
+    if pagesfn is not None and os.path.isfile(pagesfn):
+        try:
+            f = open(pagesfn,'r')
+            known = json.load(f)
+            f.close()
+        except ValueError:
+            warn("unable to read "+pagesfn+"; making it again")
+    # the contents of each piece, apart from its first page
+    pieces = []
+    for n, fns in enumerate(shards):
+        abstracts = []
+        for fn in fns:
+            f = open(os.path.join(inputdir,fn),'rb')
+            abstracts.append(f.read())
+            f.close()
+        contentkey = cache_key(all_source(fns, fmtdir)[0], toolchain_version(), *abstracts)
+        pieces.append((jobname+'-'+str(n), fns, contentkey))
+    pages = [known.get(contentkey) or -(-len(fns) // 2) for piecename, fns, contentkey in pieces]
+    with scratch_dir(scratchdir, prefix='tmp'+jobname) as tmp_dir_name:
+        def one(w):
+            (piecename, fns, contentkey), firstpage = w
+            source, fmt = all_source(fns, fmtdir, firstpage)
+            key = cache_key(contentkey, str(firstpage))
+            pdffn = os.path.join(tmp_dir_name,piecename+'.pdf')
+            with profiled(piecename,'cache'):
+                found = cache_fetch(cachedir, key, pdffn)
+            if found and known.get(contentkey):
+                return known[contentkey], True
+            if VERBOSE:
+                print("  LaTeX-ing the piece",piecename,"of all abstracts, from page",str(firstpage)+'.')
+            got = latex_document(piecename, source, pdffn, fmt=fmt, fmtdir=fmtdir, scratchdir=tmp_dir_name, inputdir=inputdir)
+            cache_store(cachedir, key, pdffn)
+            return got or 1, False
+        firstpages, todo, hits = [None]*len(pieces), list(range(len(pieces))), 0
+        rounds = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1,jobs)) as pool:
+            while todo and rounds < MAX_LATEX_PASSES:
+                rounds += 1
+                # number the pages from the lengths we have so far
+                page = 1
+                for n in range(len(pieces)):
+                    if n in todo:
+                        firstpages[n] = page
+                    page += pages[n]
+                results = list(pool.map(one, [(pieces[n], firstpages[n]) for n in todo]))
+                for n, (got, hit) in zip(todo, results):
+                    pages[n] = got
+                    known[pieces[n][2]] = got
+                    hits += hit
+                # LaTeX again the pieces that now start on another page
+                page, todo = 1, []
+                for n in range(len(pieces)):
+                    if firstpages[n] != page:
+                        todo.append(n)
+                    page += pages[n]
+                if todo and VERBOSE:
+                    print("  Pieces that start on another page than was guessed:",len(todo))
+            if todo:
+                warn("the page numbers of "+jobname+" did not settle")
+        if VERBOSE and cachedir is not None:
+            print("  All-abstracts cache: "+str(hits)+" hits.")
+        if pagesfn is not None:
+            os.makedirs(cachedir, exist_ok=True)
+            fd, tmpfn = tempfile.mkstemp(dir=cachedir, prefix='.tmp')
+            fout = os.fdopen(fd,'w')
+            json.dump(dict((contentkey, pages[n]) for n, (piecename, fns, contentkey) in enumerate(pieces)), fout)
+            fout.close()
+            os.replace(tmpfn, pagesfn)
+        # put the pieces together
+        pdffns = [os.path.join(tmp_dir_name,piece[0]+'.pdf') for piece in pieces]
+        pdffn = os.path.join(outputdir,jobname+'.pdf')
+        if len(pdffns) == 1:
+            shutil.copyfile(pdffns[0], pdffn)
+        elif pdffns:
+            unite(pdffns, pdffn, document=jobname)
 
-OUTPUT_DIR_NAME = os.getcwd()+'/output'
-#==================================================================
-def main(args):
-    # create a clean output dir
-    if os.path.isdir(OUTPUT_DIR_NAME):
-        shutil.rmtree(OUTPUT_DIR_NAME)
-    os.mkdir(OUTPUT_DIR_NAME)
-    # get all .tex files in this dir
-    filelist = glob.glob("*.tex")
+
+# ===== Making the program
+# The printed program, with the abstracts, takes pdflatex passes with 
+#   \def\printabstracts{}
+# and a makeindex run for the index of authors, which comes from the 
+# \index in \authorref.  We run pdflatex only until the files that it reads
+# back settle, makeindex only when the .idx changes, and nothing at all 
+# when none of the inputs changed since the last build.
+
+PROGRAM_SOURCE = r"\def\printabstracts{}\input{%s}"
+PROGRAM_STATE_FN = "program.json"  # what the last program build saw, in the cache dir
+
+def program_inputs_key(programfn, filelist, indexstyle=None):
+    """Return a hash of what the program document is made from: the 
+    program, the class file and pictures beside it, the abstracts in 
+    filelist, and the makeindex style.
+    """
+    dirname = os.path.dirname(os.path.abspath(programfn))
+    fns = [programfn]+sorted(glob.glob(os.path.join(dirname,'*.cls')))+sorted(glob.glob(os.path.join(dirname,'*.png')))
+    fns.extend(filelist)
+    if indexstyle is not None:
+        fns.append(indexstyle)
+    return cache_key(toolchain_version(), *[fn+"\0"+file_key(fn) for fn in fns])
+
+def make_program(programfn, filelist, indexstyle=None, cachedir=None, maxpasses=MAX_LATEX_PASSES):
+    """Make the program document with the abstracts, in the directory of 
+    programfn.  Returns the number of pdflatex passes, 0 if nothing had 
+    changed.
+      filelist  List of all abstract .tex filenames, in the 'input' dir
+      indexstyle  The makeindex style file, or None for makeindex's own
+      cachedir  Directory of the build cache, or None to always build
+    """
+    dirname = os.path.dirname(os.path.abspath(programfn))
+    jobname = os.path.splitext(os.path.basename(programfn))[0]
+    if indexstyle is not None:
+        indexstyle = os.path.abspath(indexstyle)
+    statefn = None if cachedir is None else os.path.join(cachedir,'program',jobname+'.json')
+    state = {}
+    if statefn is not None and os.path.isfile(statefn):
+        try:
+            f = open(statefn,'r')
+            state = json.load(f)
+            f.close()
+        except ValueError:
+            warn("unable to read "+statefn+"; making it again")
+    inputs = program_inputs_key(programfn, filelist, indexstyle)
+    pdffn = os.path.join(dirname,jobname+'.pdf')
+    if state.get('inputs') == inputs and os.path.isfile(pdffn):
+        if VERBOSE:
+            print("  The program",jobname+".pdf is up to date.")
+        return 0
+    keyof = lambda ext: file_key(os.path.join(dirname,jobname+ext)) if os.path.isfile(os.path.join(dirname,jobname+ext)) else None
+    cmd = ['pdflatex']+LATEX_OPTIONS+['-jobname='+jobname,PROGRAM_SOURCE % (jobname,)]
+    makeindex = ['makeindex']+([] if indexstyle is None else ['-s',indexstyle])+[jobname]
+    passes = 0
+    while passes < maxpasses:
+        before = (rerun_state(jobname, dirname), keyof('.ind'))
+        passes += 1
+        if VERBOSE:
+            print("  LaTeX-ing the program",jobname+", pass",str(passes)+'.')
+        returncode = run_command(cmd,cwd=dirname,document=jobname,step='pdflatex '+str(passes))
+        if returncode != 0 or not(os.path.isfile(pdffn)):
+            raise latex_error(jobname, dirname)
+        idx = keyof('.idx')
+        if idx is not None:  # a new style needs a new index, too
+            idx = cache_key(idx, '' if indexstyle is None else file_key(indexstyle))
+        if idx is not None and (idx != state.get('idx') or keyof('.ind') is None):
+            if VERBOSE:
+                print("  Making the index of",jobname+'.')
+            indfn = os.path.join(dirname,jobname+'.ind')
+            if os.path.isfile(indfn):
+                os.remove(indfn)  # so an old one does not look like success
+            returncode = run_command(makeindex,cwd=dirname,document=jobname,step='makeindex')
+            if returncode != 0 or not(os.path.isfile(indfn)):
+                raise HRUMCException("makeindex failed on "+jobname+"; see "+os.path.join(dirname,jobname+'.ilg'))
+            state['idx'] = idx
+        if ((rerun_state(jobname, dirname), keyof('.ind')) == before
+            and not(rerun_requested(jobname, dirname))):
+            break
+    else:
+        warn("LaTeX-ing "+jobname+" did not settle after "+str(maxpasses)+" passes")
+    if PROFILE is not None:
+        PROFILE.add_log(jobname, os.path.join(dirname,jobname+'.log'))
+    state['inputs'] = inputs
+    if statefn is not None:
+        os.makedirs(os.path.dirname(statefn), exist_ok=True)
+        fd, tmpfn = tempfile.mkstemp(dir=os.path.dirname(statefn), prefix='.tmp')
+        fout = os.fdopen(fd,'w')
+        json.dump(state, fout)
+        fout.close()
+        os.replace(tmpfn, statefn)
+    return passes
+
+
+# ===== HTML
+# For the web, and for a schedule that is kept up to date during the 
+# conference, we write the abstracts and the rooms as static HTML without 
+# running TeX at all.  Text markup is turned into HTML here, and math is 
+# left as it is, for MathJax to typeset in the browser.
+
+HTML_ABSTRACTS_DIR_NAME = "abstracts"  # in the HTML dir, a page for each abstract
+HTML_ROOMS_DIR_NAME = "rooms"  # in the HTML dir, a page for each room
+MATHJAX_URL = "https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-chtml.js"
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>%(title)s</title>
+<script>
+MathJax = {tex: {inlineMath: [['$', '$'], ['\\\\(', '\\\\)']], processEscapes: true}};
+</script>
+<script async src="%(mathjax)s"></script>
+<style>
+body { font-family: Georgia, serif; max-width: 50em; margin: 1em auto; padding: 0 1em; line-height: 1.4; }
+.room { font-size: 3em; text-align: center; }
+.speaker { font-variant: small-caps; }
+.time { white-space: nowrap; padding-right: 1em; vertical-align: top; }
+table.sortable th { cursor: pointer; text-align: left; }
+table.sortable td { padding-right: 1em; vertical-align: top; }
+</style>
+</head>
+<body>
+%(nav)s
+%(body)s
+</body>
+</html>
+"""
+HTML_SORT_SCRIPT = """<script>
+// click a column heading to sort by it
+document.querySelectorAll('table.sortable th').forEach(function(th, col) {
+  th.addEventListener('click', function() {
+    var tbody = th.closest('table').tBodies[0];
+    var rows = Array.prototype.slice.call(tbody.rows);
+    var up = th.dataset.up !== 'true';
+    th.dataset.up = up;
+    rows.sort(function(a, b) {
+      var x = a.cells[col].textContent, y = b.cells[col].textContent;
+      return (up ? 1 : -1)*x.localeCompare(y, undefined, {numeric: true});
+    });
+    rows.forEach(function(row) { tbody.appendChild(row); });
+  });
+});
+</script>
+"""
+
+TIME_MACRO_RE = re.compile(r"\\newcommand\{\\([A-Za-z]+)\}\{\\timeformat\{(\d+)\}\{(\d+)\}-\\timeformat\{(\d+)\}\{(\d+)\}\}")
+MATH_RE = re.compile(r"(?<!\\)\$\$.*?\$\$|(?<!\\)\$(?:\\.|[^$\\])+\$|\\\(.*?\\\)|\\\[.*?\\\]|\\begin\{(equation|align|gather|multline|eqnarray)\*?\}.*?\\end\{\1\*?\}", re.S)
+HTML_STYLES = {'textbf': ('<b>', '</b>'), 'textit': ('<i>', '</i>'),
+               'emph': ('<em>', '</em>'), 'textsl': ('<i>', '</i>'),
+               'texttt': ('<code>', '</code>'), 'underline': ('<u>', '</u>'),
+               'textsc': ('<span style="font-variant: small-caps">', '</span>'),
+               'textrm': ('', ''), 'textsf': ('', ''), 'mbox': ('', ''),
+               'abstractspeaker': ('<span class="speaker">', '</span>'),
+               'affiliation': (' (', ')')}
+HTML_SYMBOLS = {'\\\\': '<br>', 'newline': '<br>', 'par': '</p>\n<p>',
+                'ldots': '&hellip;', 'dots': '&hellip;', 'TeX': 'TeX',
+                'LaTeX': 'LaTeX', 'i': 'i', 'j': 'j', 'quad': '&emsp;', 'qquad': '&emsp;&emsp;',
+                '\\ ': ' ', '\\,': '&thinsp;', '\\-': '', '\\/': '',
+                '\\%': '%', '\\&': '&amp;', '\\_': '_', '\\#': '#',
+                '\\$': '\\$', '\\{': '{', '\\}': '}', 'ss': '&szlig;'}
+HTML_ENVIRONMENTS = {'itemize': ('<ul>', '</ul>'), 'enumerate': ('<ol>', '</ol>'),
+                     'center': ('<div style="text-align: center">', '</div>'),
+                     'quote': ('<blockquote>', '</blockquote>')}
+HTML_ACCENTS = {"'": "\u0301", "`": "\u0300", '"': "\u0308", '^': "\u0302",
+                '~': "\u0303", '=': "\u0304", 'u': "\u0306", 'v': "\u030c",
+                'c': "\u0327", 'H': "\u030b"}
+
+def time_macros(template):
+    r"""Return a map from each time macro defined in the template, such as
+    Ia, to the time that it gives, such as 10:00-10:15.
+    """
+    return dict((m.group(1), "%s:%s&ndash;%s:%s" % m.group(2,3,4,5))
+                for m in TIME_MACRO_RE.finditer(template))
+
+HTML_TIMES = time_macros(LATEX_ROOMS_TEMPLATE_TOP)
+
+def html_time(t):
+    r"""Return the time of a talk, such as \Ia or 9:20, as HTML.
+    """
+    name = t.strip().lstrip('\\')
+    return HTML_TIMES.get(name, html.escape(t.strip()))
+
+def _html_text(s):
+    """Return the text s, with TeX's ligatures and ties, as HTML.
+    """
+    s = html.escape(s, quote=False)
+    for tex, h in (('---', '&mdash;'), ('--', '&ndash;'), ('``', '&ldquo;'),
+                   ("''", '&rdquo;'), ('`', '&lsquo;'), ("'", '&rsquo;'),
+                   ('~', '&nbsp;')):
+        s = s.replace(tex, h)
+    return re.sub(r"\n[ \t]*\n\s*", "</p>\n<p>", s)
+
+def _html_argument(tokens, i):
+    """Return the HTML of the argument at or after tokens[i], a group or a
+    single token, and the index of the token after it.
+    """
+    while i < len(tokens) and (tokens[i][0] == 'comment' or (tokens[i][0] == 'text' and not(tokens[i][1].strip()))):
+        i += 1
+    if i >= len(tokens):
+        return '', i
+    out = []
+    if tokens[i][0] == 'open':
+        i = _html_tokens(tokens, i+1, out)
+    else:
+        i = _html_tokens(tokens, i, out, single=True)
+    return "".join(out), i
+
+def _html_tokens(tokens, i, out, single=False):
+    """Append to out the HTML of tokens from i up to the close of the 
+    group, or of just one token if single, and return the index after.
+    """
+    while i < len(tokens):
+        kind, value, linenumber = tokens[i]
+        i += 1
+        if kind == 'close':
+            return i
+        elif kind == 'open':
+            i = _html_tokens(tokens, i, out)
+        elif kind == 'comment':
+            continue
+        elif kind == 'text':
+            if single:
+                # an argument that is not in braces is one character
+                out.append(_html_text(value.lstrip()[:1]))
+                if value.lstrip()[1:]:
+                    i -= 1
+                    tokens[i] = ('text', value.lstrip()[1:], linenumber)
+                return i
+            out.append(_html_text(value))
+        else:
+            name = value[1:] if value[1:].isalpha() else value
+            if name in HTML_SYMBOLS:
+                out.append(HTML_SYMBOLS[name])
+            elif name in HTML_STYLES:
+                arg, i = _html_argument(tokens, i)
+                out.append(HTML_STYLES[name][0]+arg+HTML_STYLES[name][1])
+            elif value[1:] in HTML_ACCENTS:
+                arg, i = _html_argument(tokens, i)
+                out.append(unicodedata.normalize('NFC', html.unescape(arg)[:1]+HTML_ACCENTS[value[1:]]+html.unescape(arg)[1:]))
+            elif name == 'url':
+                url, i = read_group(tokens, i)
+                out.append('<a href="%s">%s</a>' % (html.escape(url.strip()), html.escape(url.strip())))
+            elif name == 'href':
+                url, i = read_group(tokens, i)
+                text, i = _html_argument(tokens, i)
+                out.append('<a href="%s">%s</a>' % (html.escape(url.strip()), text))
+            elif name == 'authorref':
+                first, i = _html_argument(tokens, i)
+                last, i = _html_argument(tokens, i)
+                out.append(first+" "+last)
+            elif name in ('begin', 'end'):
+                environment, i = read_group(tokens, i)
+                tags = HTML_ENVIRONMENTS.get(environment.strip(), ('', ''))
+                out.append(tags[0] if name == 'begin' else tags[1])
+            elif name == 'item':
+                out.append('<li>')
+            # other commands are dropped, leaving their arguments' text
+        if single:
+            return i
+    return i
+
+def tex_to_html(s):
+    r"""Return the TeX source s as HTML.  Math, in $..$, \(..\), \[..\], 
+    and display environments, is kept as it is, for MathJax.
+    """
+    maths = []
+    def hold(m):
+        maths.append(m.group())
+        return "\0"+str(len(maths)-1)+"\0"
+    s = MATH_RE.sub(hold, s)
+    out = []
+    _html_tokens(tex_tokens(s), 0, out)
+    h = "".join(out).strip()
+    return re.sub("\0(\\d+)\0", lambda m: html.escape(maths[int(m.group(1))], quote=False), h)
+
+def html_page(title, body, nav=''):
+    """Return a whole HTML page.
+    """
+    return HTML_TEMPLATE % {'title': html.escape(title), 'mathjax': MATHJAX_URL,
+                            'nav': nav, 'body': body}
+
+def html_slug(name):
+    """Return a name, such as a room, made safe for a file name.
+    """
+    return re.sub(r"[^A-Za-z0-9]+", "-", name).strip('-') or 'x'
+
+def write_if_changed(fn, text):
+    """Write text to fn, unless that is already there.  The new file is put
+    in place with a rename, so a web server never sends half of one.
+    """
+    try:
+        f = open(fn,'r',encoding='utf-8')
+        same = (f.read() == text)
+        f.close()
+        if same:
+            return False
+    except OSError:
+        pass
+    fd, tmpfn = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fn)), prefix='.tmp')
+    fout = os.fdopen(fd,'w',encoding='utf-8')
+    fout.write(text)
+    fout.close()
+    os.chmod(tmpfn, 0o644)
+    os.replace(tmpfn, fn)
+    return True
+
+def html_abstract(key, fields, talks=()):
+    """Return the HTML of one abstract, from read_abstract_fields, with the
+    times and rooms of its talks.
+    """
+    parts = ['<h1>%s</h1>' % (tex_to_html(fields['title']),),
+             '<p class="speaker">%s</p>' % (tex_to_html(fields['authors']),),
+             '<p>%s, Level %s</p>' % (tex_to_html(fields['subject']), tex_to_html(fields['level']))]
+    for t in talks:
+        parts.append('<p>%s, <a href="../%s/%s.html">%s</a>, %s</p>' % (html.escape(t.session.name), HTML_ROOMS_DIR_NAME, html_slug(t.session.room), html.escape(t.session.room), html_time(t.time)))
+    parts.append('<p>%s</p>' % (tex_to_html(fields['body']),))
+    return "\n".join(parts)
+
+def make_html(htmldir, filelist, program=None):
+    """Write the HTML pages to htmldir: one for each abstract, one listing 
+    them all that can be sorted by any column, one for each room, and an
+    index with the schedule.  Returns the number of pages that changed.
+    """
+    for dirname in (htmldir, os.path.join(htmldir,HTML_ABSTRACTS_DIR_NAME), os.path.join(htmldir,HTML_ROOMS_DIR_NAME)):
+        os.makedirs(dirname, exist_ok=True)
+    by_abstract = {} if program is None else program.by_abstract
+    changed, rows, titles = 0, [], {}
+    for fn in filelist:
+        key = os.path.splitext(os.path.basename(fn))[0]
+        f = open(fn,'r',encoding='utf-8',errors='replace')
+        text = f.read()
+        f.close()
+        try:
+            fields = read_abstract_fields(text)
+        except HRUMCException as e:
+            warn(fn+": "+str(e))
+            continue
+        titles[key] = tex_to_html(fields['title'])
+        nav = '<p><a href="../index.html">Schedule</a> &middot; <a href="../all.html">All abstracts</a></p>'
+        changed += write_if_changed(os.path.join(htmldir,HTML_ABSTRACTS_DIR_NAME,key+'.html'),
+                                    html_page(plain_text(fields['title']), html_abstract(key, fields, by_abstract.get(key, ())), nav))
+        rows.append('<tr><td><a href="%s/%s.html">%s</a></td><td class="speaker">%s</td><td>%s</td><td>%s</td><td>%s</td></tr>'
+                    % (HTML_ABSTRACTS_DIR_NAME, key, titles[key], ", ".join(html.escape(n) for n in speaker_names(fields['authors'])),
+                       tex_to_html(fields['subject']), tex_to_html(fields['level']),
+                       "; ".join(html.escape(t.session.room)+" "+html_time(t.time) for t in by_abstract.get(key, ()))))
+    body = ['<h1>All abstracts</h1>',
+            '<table class="sortable">',
+            '<thead><tr><th>Title</th><th>Speakers</th><th>Subject</th><th>Level</th><th>Where</th></tr></thead>',
+            '<tbody>']+rows+['</tbody>', '</table>', HTML_SORT_SCRIPT]
+    changed += write_if_changed(os.path.join(htmldir,'all.html'), html_page("All abstracts", "\n".join(body), '<p><a href="index.html">Schedule</a></p>'))
+    if program is None:
+        return changed
+    def talk(t, up):
+        if t.key not in titles:  # no page to link to
+            return '<tr><td class="time">%s</td><td>%s</td></tr>' % (html_time(t.time), html.escape(t.key))
+        return '<tr><td class="time">%s</td><td><a href="%s%s/%s.html">%s</a></td></tr>' % (html_time(t.time), up, HTML_ABSTRACTS_DIR_NAME, t.key, titles[t.key])
+    # a page for each room, like its sign
+    for room in program.rooms:
+        body = ['<p class="room">%s</p>' % (html.escape(room),)]
+        for ps in program.parallelsessions:
+            sessions = [s for s in ps.sessions if s.room == room]
+            if not(sessions):
+                continue
+            if ps.name is not None:
+                body.append('<h2>Session %s</h2>' % (html.escape(ps.name),))
+            for s in sessions:
+                body.append('<h3>%s</h3>\n<p>Chair: %s</p>\n<table>' % (html.escape(s.name), html.escape(s.chair)))
+                body.extend(talk(t, '../') for t in s.talks)
+                body.append('</table>')
+        nav = '<p><a href="../index.html">Schedule</a> &middot; <a href="../all.html">All abstracts</a></p>'
+        changed += write_if_changed(os.path.join(htmldir,HTML_ROOMS_DIR_NAME,html_slug(room)+'.html'), html_page(room, "\n".join(body), nav))
+    # the whole schedule
+    body = ['<h1>Schedule</h1>']
+    for ps in program.parallelsessions:
+        if ps.name is not None:
+            body.append('<h2>Session %s</h2>' % (html.escape(ps.name),))
+        for s in ps.sessions:
+            body.append('<h3>%s, <a href="%s/%s.html">%s</a></h3>\n<p>Chair: %s</p>\n<table>' % (html.escape(s.name), HTML_ROOMS_DIR_NAME, html_slug(s.room), html.escape(s.room), html.escape(s.chair)))
+            body.extend(talk(t, '') for t in s.talks)
+            body.append('</table>')
+    changed += write_if_changed(os.path.join(htmldir,'index.html'), html_page("Schedule", "\n".join(body), '<p><a href="all.html">All abstracts</a></p>'))
+    return changed
+
+
+# ===== Distributed builds
+# Machines that share a filesystem can split up the LaTeX-ing.  The 
+# coordinator writes each job, its source and the files that it inputs,
+# into the new dir of a spool dir.  Any number of workers, on any hosts,
+# claim jobs by renaming them into the claimed dir, which only one of them
+# can do.  A worker touches its claim every so often while it works, and
+# puts the .pdf and the result in the done dir.  A claim that has not been
+# touched in a while is from a worker that died, so the coordinator puts 
+# that job back.  No server is needed, only the directory.
+
+SPOOL_NEW_DIR_NAME = "new"  # jobs waiting for a worker
+SPOOL_CLAIMED_DIR_NAME = "claimed"  # jobs being worked on
+SPOOL_DONE_DIR_NAME = "done"  # results, waiting for the coordinator
+SPOOL_POLL_SECS = 0.5  # how often to look for jobs, or for results
+SPOOL_HEARTBEAT_SECS = 10  # how often a worker touches its claim
+SPOOL_STALE_SECS = 120  # a claim not touched in this long is abandoned
+SPOOL_RETRIES = 2  # times to put back a job whose worker died or had trouble
+
+def spool_dirs(spooldir):
+    """Return the new, claimed, and done dirs of the spool dir, making them
+    if need be.
+    """
+    dirnames = [os.path.join(spooldir,name) for name in (SPOOL_NEW_DIR_NAME, SPOOL_CLAIMED_DIR_NAME, SPOOL_DONE_DIR_NAME)]
+    for dirname in dirnames:
+        os.makedirs(dirname, exist_ok=True)
+    return dirnames
+
+def spool_write(fn, data):
+    """Write the bytes data to fn, with a rename so that no one reads half 
+    of it.
+    """
+    fd, tmpfn = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fn)), prefix='.tmp')
+    fout = os.fdopen(fd,'wb')
+    fout.write(data)
+    fout.close()
+    os.replace(tmpfn, fn)
+
+def spool_job(jobname, source, inputs, crop=False):
+    """Return a job, to LaTeX the source as jobname.tex.
+      inputs  Map from the name that TeX will find a file under to the 
+        path of the file
+      crop  If True, crop the .pdf with pdfcrop, as for an abstract made 
+        with LATEX_PDFCROP_TEMPLATE
+    """
+    files = {}
+    for name, fn in inputs.items():
+        f = open(fn,'rb')
+        files[name] = base64.b64encode(f.read()).decode('ascii')
+        f.close()
+    return {'jobname': jobname, 'source': source, 'files': files, 'crop': crop}
+
+def spool_run(job, scratchdir=SCRATCH_DIR_NAME):
+    """LaTeX the job in a private temp dir under scratchdir.  Returns the 
+    bytes of the .pdf and its number of pages.
+    """
+    jobname = job['jobname']
+    with scratch_dir(scratchdir, prefix='tmp'+jobname) as tmp_dir_name:
+        for name, data in job['files'].items():
+            fout = open(os.path.join(tmp_dir_name,os.path.basename(name)),'wb')
+            fout.write(base64.b64decode(data))
+            fout.close()
+        fout = open(os.path.join(tmp_dir_name,jobname+'.tex'),'w')
+        fout.write(job['source'])
+        fout.close()
+        run_pdflatex(jobname,tmp_dir_name)
+        pdfname = jobname+'.pdf'
+        if job['crop']:
+            crop(jobname,tmp_dir_name)
+            pdfname = jobname+'-crop.pdf'
+        f = open(os.path.join(tmp_dir_name,pdfname),'rb')
+        pdf = f.read()
+        f.close()
+        return pdf, log_pages(os.path.join(tmp_dir_name,jobname+'.log'))
+
+def worker_name():
+    """Return a name for this worker that is different from that of any 
+    other, and has no dots.
+    """
+    return re.sub(r"[^A-Za-z0-9-]", "-", socket.gethostname() or 'localhost')+'-'+str(os.getpid())
+
+def spool_claim(spooldir, worker):
+    """Claim the oldest job in the spool dir.  Returns its id and the name 
+    of the claim, or None if there are no jobs.
+    """
+    newdir, claimeddir, donedir = spool_dirs(spooldir)
+    for name in sorted(os.listdir(newdir)):
+        if name.startswith('.') or not(name.endswith('.json')):
+            continue
+        id = name[:-len('.json')]
+        claimfn = os.path.join(claimeddir,id+'.'+worker+'.json')
+        try:
+            os.rename(os.path.join(newdir,name), claimfn)
+        except FileNotFoundError:
+            continue  # another worker got it first
+        os.utime(claimfn)  # the claim is as old as the job; it starts fresh
+        return id, claimfn
+    return None
+
+def work(spooldir, scratchdir=SCRATCH_DIR_NAME):
+    """Be a worker: claim the jobs in the spool dir, one at a time, LaTeX 
+    them, and put the results in the done dir.  Runs until Ctrl-C.
+    """
+    worker = worker_name()
+    newdir, claimeddir, donedir = spool_dirs(spooldir)
+    if VERBOSE:
+        print("Worker",worker,"waiting for jobs in",spooldir+"; Ctrl-C to stop.")
+    while True:
+        claim = spool_claim(spooldir, worker)
+        if claim is None:
+            time.sleep(SPOOL_POLL_SECS)
+            continue
+        id, claimfn = claim
+        # keep the claim fresh, so the coordinator knows this worker is alive
+        stop = threading.Event()
+        def heartbeat():
+            while not(stop.wait(SPOOL_HEARTBEAT_SECS)):
+                try:
+                    os.utime(claimfn)
+                except OSError:
+                    return  # the coordinator took the job back
+        beat = threading.Thread(target=heartbeat, daemon=True)
+        beat.start()
+        try:
+            f = open(claimfn,'r',encoding='utf-8')
+            job = json.load(f)
+            f.close()
+            if VERBOSE:
+                print("  LaTeX-ing the file",job['jobname']+'.')
+            result = {'status': 'ok', 'message': '', 'log': '', 'pages': None, 'worker': worker}
+            try:
+                pdf, result['pages'] = spool_run(job, scratchdir)
+                spool_write(os.path.join(donedir,id+'.pdf'), pdf)
+            except LaTeXError as e:
+                result.update(status='latex', message=str(e), log=e.log)
+            except (HRUMCException, OSError) as e:
+                result.update(status='error', message=str(e))
+            spool_write(os.path.join(donedir,id+'.json'), json.dumps(result).encode('utf-8'))
+        except OSError as e:
+            warn("unable to do job "+id+": "+str(e))
+        finally:
+            stop.set()
+            beat.join()
+        try:
+            os.remove(claimfn)
+        except OSError:
+            pass  # taken back
+
+def spool_exception(result):
+    """Return the exception for a job that failed, from its result.
+    """
+    if result['status'] == 'latex':
+        return LaTeXError(result['message'], result['log'])
+    return HRUMCException(result['message'])
+
+class Spool(object):
+    """The coordinator's side of a spool dir: it sends jobs and collects 
+    their results, putting back the jobs of workers that die.
+    """
+    def __init__(self, spooldir):
+        self.spooldir = spooldir
+        self.newdir, self.claimeddir, self.donedir = spool_dirs(spooldir)
+        # ids sort in the order they were sent, and differ from those of 
+        # any other coordinator
+        self.prefix = time.strftime('%Y%m%d%H%M%S')+'-'+os.urandom(4).hex()
+        self.count = 0
+        self.jobs = {}  # id to job, until it is finished
+        self.attempts = {}  # id to times it was put back
+
+    def submit(self, job):
+        """Send the job.  Returns its id.
+        """
+        id = "%s-%05d" % (self.prefix, self.count)
+        self.count += 1
+        self.jobs[id] = job
+        self.attempts[id] = 0
+        self.put(id)
+        return id
+
+    def put(self, id):
+        spool_write(os.path.join(self.newdir,id+'.json'), json.dumps(self.jobs[id]).encode('utf-8'))
+
+    def retry(self, id, message):
+        """Put the job back, if it has not been put back too often.  Returns
+        True if it was.
+        """
+        if self.attempts[id] >= SPOOL_RETRIES:
+            return False
+        self.attempts[id] += 1
+        warn("trying "+self.jobs[id]['jobname']+" again: "+message)
+        self.put(id)
+        return True
+
+    def collect(self, id):
+        """Return the result of the job and the bytes of its .pdf, or None
+        if it is not done.
+        """
+        resultfn = os.path.join(self.donedir,id+'.json')
+        if not(os.path.isfile(resultfn)):
+            return None
+        f = open(resultfn,'r',encoding='utf-8')
+        result = json.load(f)
+        f.close()
+        pdf = None
+        pdffn = os.path.join(self.donedir,id+'.pdf')
+        if result['status'] == 'ok':
+            f = open(pdffn,'rb')
+            pdf = f.read()
+            f.close()
+        # with the copy of the job, if it was put back before this came in
+        for fn in (resultfn, pdffn, os.path.join(self.newdir,id+'.json')):
+            try:
+                os.remove(fn)
+            except OSError:
+                pass
+        return result, pdf
+
+    def abandoned(self, id):
+        """Take back the job if its worker stopped touching the claim.  
+        Returns True if it did.
+        """
+        for claimfn in glob.glob(os.path.join(self.claimeddir,id+'.*.json')):
+            try:
+                if time.time()-os.path.getmtime(claimfn) < SPOOL_STALE_SECS:
+                    continue
+                os.remove(claimfn)
+            except OSError:
+                continue  # the worker just finished
+            return True
+        return False
+
+    def results(self):
+        """Wait for the jobs to finish, yielding the id, the result, and the
+        bytes of the .pdf (or None) of each, in the order that they finish.
+        A job is put back, at most SPOOL_RETRIES times, if its worker died 
+        or had trouble other than a LaTeX error.
+        """
+        while self.jobs:
+            progress = False
+            for id in list(self.jobs):
+                done = self.collect(id)
+                if done is None and self.abandoned(id):
+                    done = ({'status': 'error', 'message': "the worker stopped answering", 'log': ''}, None)
+                if done is None:
+                    continue
+                progress = True
+                result, pdf = done
+                if result['status'] == 'error' and self.retry(id, result['message']):
+                    continue
+                del self.jobs[id]
+                yield id, result, pdf
+            if not(progress):
+                time.sleep(SPOOL_POLL_SECS)
+
+    def close(self):
+        """Take back the jobs that no worker has claimed.
+        """
+        for id in self.jobs:
+            try:
+                os.remove(os.path.join(self.newdir,id+'.json'))
+            except OSError:
+                pass
+
+
+# ===== The build, as an object
+# Everything above takes its paths as arguments.  A ConferenceBuild holds 
+# them for one conference, so that the documents can be made from another
+# program, such as a web application, without changing directory.
+
+class ConferenceBuild(object):
+    r"""The paths of one conference, and ways to make its documents.  No 
+    method changes the working directory or any module global, and each 
+    LaTeX-ing method works in its own scratch dir, so one of these, or 
+    several, can be used from many threads at once.  (Threads that make 
+    the same document into the same place will still overwrite each 
+    other.)  VERBOSE, DEBUG, TIMEOUT, and PROFILE are read as settings for 
+    the whole process.
+      inputdir  Directory of the abstracts
+      programfn  The program; default: DEFAULT_PROGRAM_NAME in the 
+        directory above inputdir
+      outputdir  Directory for the all-abstracts and rooms documents; 
+        default: inputdir
+      pdfdir  Directory for the .pdf of each abstract; default: 
+        OUTPUT_DIR_NAME in outputdir
+      scratch  Directory under which to make scratch dirs; default: 
+        SCRATCH_DIR_NAME in inputdir
+      cachedir  Directory of the build cache and the abstract index; 
+        default: CACHE_DIR_NAME in inputdir
+      cache  If False, do not reuse or save LaTeX-ed documents
+      formats  If True, precompile the preamble of each template
+      pdfcrop  If True, crop the abstracts with pdfcrop; see latex_each
+    """
+    def __init__(self, inputdir, programfn=None, outputdir=None, pdfdir=None, scratch=None, cachedir=None, cache=True, formats=False, pdfcrop=False):
+        self.inputdir = os.path.abspath(inputdir)
+        self.programfn = os.path.abspath(programfn or os.path.join(self.inputdir,'..',DEFAULT_PROGRAM_NAME))
+        self.outputdir = os.path.abspath(outputdir or self.inputdir)
+        self.pdfdir = os.path.abspath(pdfdir or os.path.join(self.outputdir,OUTPUT_DIR_NAME))
+        self.scratch = os.path.abspath(scratch or os.path.join(self.inputdir,SCRATCH_DIR_NAME))
+        self.cachedir = os.path.abspath(cachedir or os.path.join(self.inputdir,CACHE_DIR_NAME))
+        self.cache = cache
+        self.fmtdir = os.path.join(self.cachedir,'fmt') if formats else None
+        self.pdfcrop = pdfcrop
+        self.faileddir = os.path.join(self.pdfdir,FAILED_DIR_NAME)
+
+    def build_cachedir(self):
+        """Return the cache dir for LaTeX-ed documents, or None.
+        """
+        return self.cachedir if self.cache else None
+
+    @contextlib.contextmanager
+    def scratch_dir(self):
+        """Make a private scratch dir, and remove it afterward.  The dir 
+        that it is in is left, as another thread may be using it.
+        """
+        os.makedirs(self.scratch, exist_ok=True)
+        tmp_dir_name = tempfile.mkdtemp(prefix='hrumc', dir=self.scratch)
+        try:
+            yield tmp_dir_name
+        finally:
+            shutil.rmtree(tmp_dir_name)
+
+    def filelist(self):
+        """Return the sorted list of the paths of the abstracts.
+        """
+        return abstract_filelist(self.programfn, self.inputdir)
+
+    def program(self):
+        """Read the program.
+        """
+        return read_program(self.programfn)
+
+    def index(self, filelist=None):
+        """Return the metadata of the abstracts, from read_abstract_index.
+        """
+        return read_abstract_index(self.filelist() if filelist is None else filelist, os.path.join(self.cachedir,INDEX_FN))
+
+    def check(self, filelist=None, program=None):
+        """Check the schedule, as check_program does.  Returns a list of 
+        errors and a list of warnings.
+        """
+        filelist = self.filelist() if filelist is None else filelist
+        return check_program(self.program() if program is None else program, filelist, self.index(filelist))
+
+    def lint(self, filelist=None):
+        """Lint the abstracts, as lint_file does.  Returns a map from the 
+        path of each abstract to its list of errors and list of warnings.
+        """
+        return dict((fn, lint_file(fn)) for fn in (self.filelist() if filelist is None else filelist))
+
+    def abstracts(self, filelist=None, jobs=1, batch=False, failures=None):
+        """Make the .pdf of each abstract in pdfdir, as latex_each_all does.
+        Returns the list of those made.
+        """
+        os.makedirs(self.pdfdir, exist_ok=True)
+        with self.scratch_dir() as scratchdir:
+            return latex_each_all(self.filelist() if filelist is None else filelist, pdfdirname=self.pdfdir, jobs=jobs, cachedir=self.build_cachedir(), batch=batch, fmtdir=self.fmtdir, scratchdir=scratchdir, failures=failures, pdfcrop=self.pdfcrop)
+
+    def all_abstracts(self, filelist=None, jobname='hrumcall', sortby='filename', sharded=False, jobs=1):
+        """Make the document of all abstracts in outputdir, as latex_all 
+        does.  Returns its name.
+        """
+        filelist = self.filelist() if filelist is None else filelist
+        index = None if sortby == 'filename' else self.index(filelist)
+        with self.scratch_dir() as scratchdir:
+            latex_all(jobname, filelist, fmtdir=self.fmtdir, scratchdir=scratchdir, sortby=sortby, index=index, sharded=sharded, jobs=jobs, cachedir=self.build_cachedir(), inputdir=self.inputdir, outputdir=self.outputdir)
+        return os.path.join(self.outputdir,jobname+'.pdf')
+
+    def rooms(self, program=None, jobname='rooms', sharded=False, jobs=1, missing=()):
+        """Make the room signs and the chair instructions in outputdir, as 
+        make_rooms does, leaving out the abstracts in missing.
+        """
+        with self.scratch_dir() as scratchdir:
+            make_rooms(self.programfn, None, jobname, program=(self.program() if program is None else program), fmtdir=self.fmtdir, scratchdir=scratchdir, sharded=sharded, jobs=jobs, cachedir=self.build_cachedir(), inputdir=self.inputdir, outputdir=self.outputdir, missing=missing)
+
+    def set_aside(self, jobnames, since):
+        """Move each document jobname.pdf in outputdir that was not made 
+        after the time since into faileddir, as jobname-previous.pdf, so 
+        that an old one is not taken for new.
+        """
+        for jobname in jobnames:
+            pdffn = os.path.join(self.outputdir,jobname+'.pdf')
+            try:
+                if os.path.getmtime(pdffn) >= since:
+                    continue
+            except OSError:
+                continue  # there is none
+            os.makedirs(self.faileddir, exist_ok=True)
+            os.replace(pdffn, os.path.join(self.faileddir,jobname+'-previous.pdf'))
+
+    def program_document(self, filelist=None, indexstyle=None):
+        """Make the program document, as make_program does.  Returns the 
+        number of pdflatex passes.
+        """
+        return make_program(self.programfn, self.filelist() if filelist is None else filelist, indexstyle=indexstyle, cachedir=self.build_cachedir())
+
+    def html(self, htmldir, filelist=None, program=None):
+        """Write the HTML pages, as make_html does, using the program if 
+        there is one.  Returns the number of pages that changed.
+        """
+        if program is None and os.path.isfile(self.programfn):
+            program = self.program()
+        return make_html(htmldir, self.filelist() if filelist is None else filelist, program)
+
+    def distributed(self, spooldir, filelist=None, program=None, sortby='filename', abstracts=True, all_abstracts=True, rooms=True, failures=None):
+        """Make the documents by sending them through the spool dir to 
+        workers, which may be on other hosts; see work.  Abstracts that are
+        in the cache are not sent.  Each document is sent whole, so there 
+        is no batching, sharding, or formats.  A document that cannot be 
+        made is quarantined, as in build.
+          failures  List to note the failures in, as quarantine does; 
+            default: a new one
+        """
+        filelist = self.filelist() if filelist is None else filelist
+        failures = [] if failures is None else failures
+        inputs = dict((os.path.basename(fn), fn) for fn in filelist)
+        cachedir = self.build_cachedir()
+        if cachedir is not None:
+            cachedir = os.path.join(cachedir,'each')
+        spool = Spool(spooldir)
+        sent = {}  # id to the document, where its .pdf goes, and its cache key
+        def send(jobname, source, inputs, pdffn, key=None, crop=False):
+            sent[spool.submit(spool_job(include_jobname(jobname), source, inputs, crop))] = (jobname, pdffn, key)
+        def send_all(fns):
+            index = None if sortby == 'filename' else self.index(fns)
+            source, fmt = all_source(sort_abstracts(fns, index, sortby))
+            send('hrumcall', source, dict((os.path.basename(fn), fn) for fn in fns), os.path.join(self.outputdir,'hrumcall.pdf'))
+        def send_rooms(missing=()):
+            for jobname, template, lines in (('rooms', LATEX_ROOMS_TEMPLATE_TOP, room_lines), 
+                                             ('roomschair', LATEX_CHAIR_TEMPLATE, chair_lines)):
+                source, fmt = room_source(template, lambda k, lines=lines: lines(program, k, missing), program.rooms)
+                send(jobname, source, inputs, os.path.join(self.outputdir,jobname+'.pdf'))
+        since = time.time()
+        failed = set(document for document, message in failures)
+        deferred = {}  # document to result, for those that failed abstracts may have sunk
+        def receive(retrying=False):
+            for id, result, pdf in spool.results():
+                jobname, pdffn, key = sent[id]
+                if result['status'] == 'ok':
+                    fout = open(pdffn,'wb')
+                    fout.write(pdf)
+                    fout.close()
+                    if key is not None:
+                        cache_store(cachedir, key, pdffn)
+                    if VERBOSE:
+                        print("  Made",jobname,"on",result['worker']+'.')
+                elif jobname in ('hrumcall', 'rooms', 'roomschair') and not(retrying):
+                    deferred[jobname] = result
+                else:
+                    quarantine(jobname, spool_exception(result), self.faileddir, failures)
+                    failed.add(jobname)
+                    self.set_aside([jobname], since)
+        try:
+            # the long documents go first, so they are started first
+            if rooms:
+                program = self.program() if program is None else program
+                send_rooms(failed)
+            if all_abstracts:
+                send_all(filelist)
+            if abstracts:
+                os.makedirs(self.pdfdir, exist_ok=True)
+                template = LATEX_PDFCROP_TEMPLATE if self.pdfcrop else LATEX_TEMPLATE
+                source, fmt = latex_source(template)
+                hits = 0
+                for fn in filelist:
+                    jobname = os.path.splitext(os.path.basename(fn))[0]
+                    pdffn = os.path.join(self.pdfdir,jobname+'.pdf')
+                    key = None
+                    if cachedir is not None:
+                        key = file_key(fn, template, toolchain_version())
+                        if cache_fetch(cachedir, key, pdffn):
+                            hits += 1
+                            continue
+                    send(jobname, source, {LATEX_INCLUDE_FN+'.tex': fn}, pdffn, key, crop=self.pdfcrop)
+                if VERBOSE and cachedir is not None:
+                    print("  Cache: "+str(hits)+" hits, "+str(len(filelist)-hits)+" misses.")
+            if VERBOSE:
+                print("  Sent",len(sent),"jobs to",spooldir+"; waiting for workers.")
+            before = set(failed)
+            receive()
+            if deferred and failed != before:
+                # try again without the abstracts that failed
+                ok = [fn for fn in filelist if os.path.splitext(os.path.basename(fn))[0] not in failed]
+                if 'hrumcall' in deferred:
+                    send_all(ok)
+                if 'rooms' in deferred or 'roomschair' in deferred:
+                    send_rooms(failed)
+                receive(retrying=True)
+            else:
+                for jobname, result in deferred.items():
+                    quarantine(jobname, spool_exception(result), self.faileddir, failures)
+                    self.set_aside([jobname], since)
+        finally:
+            spool.close()
+
+    def build(self, filelist=None, program=None, jobs=1, batch=False, sortby='filename', shardall=False, shardrooms=False, abstracts=True, all_abstracts=True, rooms=True, spooldir=None, lint=False):
+        """Make all of the documents, starting with an empty pdfdir.  A 
+        document that cannot be made is quarantined, with its log in 
+        faileddir, and the rest are made anyway.  If lint, abstracts that
+        lint finds errors in are quarantined without LaTeX-ing them.  If 
+        spooldir is not None, workers do the LaTeX-ing; see distributed.
+        Returns the list of (document, message) for those that failed.
+        """
+        filelist = self.filelist() if filelist is None else filelist
+        failures = []
+        since = time.time()
+        if os.path.isdir(self.pdfdir):
+            shutil.rmtree(self.pdfdir)
+        os.makedirs(self.pdfdir)
+        if lint:
+            linted = self.lint(filelist)
+            for fn in filelist:
+                if linted[fn][0]:
+                    quarantine(os.path.splitext(os.path.basename(fn))[0], HRUMCException("\n    ".join(linted[fn][0])), failures=failures)
+            filelist = [fn for fn in filelist if not(linted[fn][0])]
+        if spooldir is not None:
+            self.distributed(spooldir, filelist, program, sortby=sortby, abstracts=abstracts, 
+                             all_abstracts=all_abstracts, rooms=rooms, failures=failures)
+            return failures
+        if abstracts:
+            self.abstracts(filelist, jobs=jobs, batch=batch, failures=failures)
+        if all_abstracts:
+            # leave out the abstracts that already failed, so they do not sink it
+            failed = set(document for document, message in failures)
+            ok = [fn for fn in filelist if os.path.splitext(os.path.basename(fn))[0] not in failed]
+            try:
+                self.all_abstracts(ok, sortby=sortby, sharded=shardall, jobs=jobs)
+            except HRUMCException as e:
+                quarantine('hrumcall', e, self.faileddir, failures)
+                self.set_aside(['hrumcall'], since)
+        if rooms:
+            # the abstracts that failed get a placeholder
+            failed = set(document for document, message in failures)
+            try:
+                self.rooms(program, sharded=shardrooms, jobs=jobs, missing=failed)
+            except HRUMCException as e:
+                quarantine('rooms', e, self.faileddir, failures)
+                self.set_aside(['rooms', 'roomschair'], since)
+        return failures
+
+
+# ===== Watching for changes
+# While the program is being settled we stay resident and, when a file 
+# changes, rebuild only what that change affects.  We use Linux's inotify to
+# sleep until something in the watched directories changes, and if that is 
+# not available we look at the files every few seconds.
+
+WATCH_POLL_SECS = 2.0  # how often to look, without inotify
+WATCH_SETTLE_SECS = 0.3  # wait for an editor's burst of writes to finish
+
+class InotifyWatcher(object):
+    """Wait for a file in one of the directories to change, using inotify.
+    """
+    # from <sys/inotify.h>
+    IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM = 0x2, 0x8, 0x40
+    IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x80, 0x100, 0x200
+
+    def __init__(self, dirnames):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        mask = (self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO 
+                | self.IN_CREATE | self.IN_DELETE)
+        for dirname in dirnames:
+            if libc.inotify_add_watch(self.fd, os.fsencode(dirname), mask) < 0:
+                raise OSError(ctypes.get_errno(), "unable to watch "+dirname)
+
+    def wait(self):
+        select.select([self.fd],[],[])
+        os.read(self.fd, 65536)
+        while select.select([self.fd],[],[],WATCH_SETTLE_SECS)[0]:
+            os.read(self.fd, 65536)
+
+class PollingWatcher(object):
+    """Wait for a .tex file in one of the directories to change, by looking 
+    at them every WATCH_POLL_SECS.
+    """
+    def __init__(self, dirnames):
+        self.dirnames = dirnames
+        self.state = self.snapshot()
+
+    def snapshot(self):
+        state = {}
+        for dirname in self.dirnames:
+            for fn in glob.glob(os.path.join(dirname,'*.tex')):
+                try:
+                    st = os.stat(fn)
+                except OSError:
+                    continue  # it went away while we looked
+                state[fn] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def wait(self):
+        while True:
+            time.sleep(WATCH_POLL_SECS)
+            state = self.snapshot()
+            if state != self.state:
+                self.state = state
+                return
+
+def make_watcher(dirnames):
+    """Return an InotifyWatcher for the directories if we can, or else a
+    PollingWatcher.
+    """
+    try:
+        return InotifyWatcher(dirnames)
+    except (OSError, AttributeError) as e:
+        if VERBOSE:
+            print("  Unable to use inotify ("+str(e)+"); checking every",WATCH_POLL_SECS,"secs.")
+        return PollingWatcher(dirnames)
+
+def abstract_filelist(programfn, inputdir=None):
+    """Return the sorted list of abstract .tex files in this directory, or
+    in inputdir, with that directory in front of each.
+    """
+    if inputdir is None:
+        filelist = glob.glob("*.tex")
+    else:
+        filelist = [fn for fn in os.listdir(inputdir) if fn.endswith('.tex') and not(fn.startswith('.'))]
     try:                              # remove hrumc2xxx.tex, if it is there
-        filelist.remove(args['file']) 
-    except:
+        filelist.remove(os.path.basename(programfn))
+    except ValueError:
         pass
     filelist.sort()
-    if not(args['nopdfs']):
-        for fn in filelist:
-            latex_each(fn, pdfdirname=OUTPUT_DIR_NAME)
-    if not(args['noabstractlist']):
-        latex_all('hrumcall',filelist)
-    if not(args['noroomlist']):
-        make_rooms(args['file'],filelist)
+    if inputdir is not None:
+        filelist = [os.path.join(inputdir,fn) for fn in filelist]
+    return filelist
+
+def room_contents(program):
+    """Return a map from each room to the text of its sign and its chair 
+    instructions, to tell which rooms a change to the program affects.
+    """
+    return dict((room, "\n".join(room_lines(program, room)+chair_lines(program, room)))
+                for room in program.rooms)
+
+def watch(conference, args, failures=()):
+    """Stay resident, and after each change to an abstract or to the 
+    program rebuild only the outputs that it affects: the .pdf for an
+    edited abstract, the document of all abstracts, and the rooms where the 
+    abstract appears or whose sessions changed.  The rooms are always made
+    sharded, so that the others come from the cache.  As in a build, an
+    abstract that does not LaTeX is left out of the other documents until
+    it is fixed.  Stop with Ctrl-C.
+      failures  The (document, message) list from the build before
+    """
+    programfn = conference.programfn
+    failed = set(document for document, message in failures)
+    filelist = conference.filelist()
+    keys = dict((fn, file_key(fn)) for fn in filelist)
+    program_key = file_key(programfn)
+    program = read_program(programfn)
+    rooms = room_contents(program)
+    watcher = make_watcher([conference.inputdir, os.path.dirname(programfn)])
+    print("Watching for changes; Ctrl-C to stop.")
+    while True:
+        try:
+            watcher.wait()
+        except KeyboardInterrupt:
+            return
+        try:
+            # which abstracts changed?
+            new_filelist = conference.filelist()
+            new_keys = dict((fn, file_key(fn)) for fn in new_filelist)
+            changed = [fn for fn in new_filelist if keys.get(fn) != new_keys[fn]]
+            removed = [fn for fn in filelist if fn not in new_keys]
+            # which rooms changed?
+            new_program_key = file_key(programfn)
+            if new_program_key != program_key:
+                new_program = read_program(programfn)
+                if not(args['nocheck']):
+                    check(conference, new_filelist, new_program)
+            else:
+                new_program = program
+            new_rooms = room_contents(new_program)
+            affected = set(room for room in set(rooms) | set(new_rooms)
+                           if rooms.get(room) != new_rooms.get(room))
+            for fn in changed+removed:
+                key = os.path.splitext(os.path.basename(fn))[0]
+                for p in (program, new_program):
+                    affected.update(t.session.room for t in p.by_abstract.get(key, []))
+            filelist, keys = new_filelist, new_keys
+            program_key, program, rooms = new_program_key, new_program, new_rooms
+            if not(changed or removed or affected):
+                continue
+            print(time.strftime("%H:%M:%S"),"changed:",", ".join([os.path.basename(fn) for fn in changed+removed]+sorted(affected)))
+            # rebuild; a document that fails is quarantined, as in a build
+            since = time.time()
+            failures = []
+            failed.difference_update(os.path.splitext(os.path.basename(fn))[0] for fn in changed+removed)
+            if not(args['nopdfs']):
+                if changed:
+                    conference.abstracts(changed, jobs=args['jobs'], batch=args['batch'], failures=failures)
+                failed.update(document for document, message in failures)
+                # the .pdf of one that is gone or that failed is out of date
+                for key in [os.path.splitext(os.path.basename(fn))[0] for fn in removed]+sorted(failed):
+                    pdffn = os.path.join(conference.pdfdir,key+'.pdf')
+                    if os.path.isfile(pdffn):
+                        os.remove(pdffn)
+            if not(args['noabstractlist']) and (changed or removed):
+                ok = [fn for fn in filelist if os.path.splitext(os.path.basename(fn))[0] not in failed]
+                try:
+                    conference.all_abstracts(ok, sortby=args['sort_by'], sharded=args['shardall'], jobs=args['jobs'])
+                except HRUMCException as e:
+                    quarantine('hrumcall', e, conference.faileddir, failures)
+                    conference.set_aside(['hrumcall'], since)
+            if not(args['noroomlist']) and affected:
+                if VERBOSE:
+                    print("  Rooms affected:",", ".join(sorted(affected)))
+                # sharded, so the rooms not affected are cache hits
+                try:
+                    conference.rooms(program, sharded=True, jobs=args['jobs'], missing=failed)
+                except HRUMCException as e:
+                    quarantine('rooms', e, conference.faileddir, failures)
+                    conference.set_aside(['rooms', 'roomschair'], since)
+        except KeyboardInterrupt:
+            return
+        except Exception as e:
+            # keep watching; the next save may fix it
+            warn("unable to rebuild: "+str(e))
+            if DEBUG:
+                traceback.print_exc()
+
+
+#==================================================================
+def main(args):
+    conference = ConferenceBuild(os.getcwd(), programfn=os.path.join('..',args['file']),
+                                 scratch=args['scratch'], cachedir=args['cachedir'],
+                                 cache=not(args['nocache']), formats=args['formats'],
+                                 pdfcrop=args['pdfcrop'])
+    if args['worker']:
+        # LaTeX what coordinators send, until stopped
+        try:
+            work(args['worker'], conference.scratch)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args['query']:
+        # just look up abstracts; no LaTeX
+        index = conference.index()
+        try:
+            found = find_abstracts(index, args['query'])
+        except HRUMCException as e:
+            error(str(e)+"\n")
+        for fn in found:
+            print("%s\t%s\t%s\tLevel %s\t%s" % (index[fn]['key'], index[fn].get('authors'), index[fn].get('title'), index[fn].get('level'), index[fn].get('subject')))
+        return
+    if args['assignrooms']:
+        # just change the rooms in the program; no LaTeX
+        programfn = conference.programfn
+        program = read_program(programfn)
+        attendance = None
+        try:
+            if args['attendance']:
+                attendance = dict(read_table(args['attendance']))
+            assigned = assign_rooms(program, read_table(args['assignrooms']), attendance, args['buildingpenalty'])
+        except HRUMCException as e:
+            error(str(e)+"\n")
+        write_rooms(programfn, assigned)
+        for s in program.sessions():
+            print("%s\t%s\t%s" % (s.parallelsession.name, s.name, assigned[s.linenumber]))
+        if VERBOSE:
+            print("Rooms written to",programfn+"; the old program is in",programfn+'.bak')
+        return
+    if args['program']:
+        # just make the program document
+        filelist = conference.filelist()
+        if not(args['nocheck']) and check(conference, filelist):
+            error("the schedule has errors; fix them, or use --nocheck\n")
+        try:
+            passes = conference.program_document(filelist, indexstyle=args['indexstyle'])
+        except HRUMCException as e:
+            error(str(e)+"\n")
+        if VERBOSE:
+            print("Program made with",passes,"pdflatex passes.")
+        if PROFILE is not None:
+            PROFILE.write(args['profile'])
+            print("\n".join(PROFILE.summary()))
+        return
+    if args['html']:
+        # the HTML pages; no LaTeX
+        html_build(conference, args)
+        if args['watch']:
+            watcher = make_watcher([conference.inputdir, os.path.dirname(conference.programfn)])
+            print("Watching for changes; Ctrl-C to stop.")
+            while True:
+                try:
+                    watcher.wait()
+                    html_build(conference, args)
+                except KeyboardInterrupt:
+                    return
+                except HRUMCException as e:
+                    warn("unable to rebuild: "+str(e))
+        return
+    if args['check']:
+        # just check the schedule and the abstracts; no LaTeX
+        if check(conference, lint=True):
+            sys.exit(10)
+        return
+    made_scratch_base = not(os.path.isdir(conference.scratch))
+    try:
+        build(conference, args)
+    finally:
+        if made_scratch_base:
+            try:
+                os.rmdir(conference.scratch)
+            except OSError:
+                pass  # another build is using it
+
+def check(conference, filelist=None, program=None, lint=False):
+    """Check the schedule, and if lint then lint the abstracts, printing
+    the warnings and errors.  Returns the number of errors.
+    """
+    program = conference.program() if program is None else program
+    errors, warnings = conference.check(filelist, program)
+    if lint:
+        for fn, (lint_errors, lint_warnings) in sorted(conference.lint(filelist).items()):
+            errors.extend(lint_errors)
+            warnings.extend(lint_warnings)
+    for s in warnings:
+        warn(s)
+    for s in errors:
+        sys.stderr.write('ERROR! '+s+"\n")
+    if VERBOSE:
+        checked = str(len(program.talks()))+" talks in "+str(len(program.sessions()))+" sessions"
+        if lint:
+            checked += " and "+str(len(conference.filelist() if filelist is None else filelist))+" abstracts"
+        print("Checked "+checked+":",len(errors),"errors,",len(warnings),"warnings.")
+    return len(errors)
+
+def html_build(conference, args):
+    start = time.perf_counter()
+    filelist = conference.filelist()
+    changed = conference.html(args['html'], filelist)
+    if VERBOSE:
+        print("HTML for",len(filelist),"abstracts in",args['html']+":",changed,"pages changed, in %0.2f secs." % (time.perf_counter()-start,))
+
+def build(conference, args):
+    # get all .tex files in this dir
+    filelist = conference.filelist()
+    if not(args['nocheck']):
+        if not(os.path.isfile(conference.programfn)):
+            warn("there is no program "+conference.programfn+"; not checking the schedule")
+        elif check(conference, filelist):
+            error("the schedule has errors; fix them, or use --nocheck\n")
+    program = None
+    if not(args['noroomlist']) or args['dumpprogram']:
+        program = conference.program()
+    if args['dumpprogram']:
+        if args['dumpprogram'] == '-':
+            print(program.to_json())
+        else:
+            fout = open(args['dumpprogram'],'w')
+            print(program.to_json(), file=fout)
+            fout.close()
+    failures = conference.build(filelist, program, jobs=args['jobs'], batch=args['batch'],
+                                sortby=args['sort_by'], shardall=args['shardall'],
+                                shardrooms=args['shardrooms'] or args['watch'],  # so watch can reuse the rooms
+                                abstracts=not(args['nopdfs']), all_abstracts=not(args['noabstractlist']),
+                                rooms=not(args['noroomlist']), spooldir=args['spool'], lint=args['lint'])
+    if PROFILE is not None:
+        PROFILE.write(args['profile'])
+        print("\n".join(PROFILE.summary()))
+        print("Profile written to",args['profile'])
+    if failures:
+        print("Unable to make "+str(len(failures))+" documents; the logs are in "+conference.faileddir+":")
+        for document, message in failures:
+            print("  "+document+": "+message.split("\n")[0])
+    if args['watch']:
+        watch(conference, args, failures)
+    elif failures:
+        error("the build is not complete\n")
 
 #==================================================================
 if __name__ == '__main__':
@@ -542,9 +3327,35 @@ if __name__ == '__main__':
         start_time = time.time()
         parser = argparse.ArgumentParser(description=globals()['__doc__'])
         parser.add_argument('-a','--noabstractlist', action='store_true', default=False, help='suppress generation of a single list of all abstracts')
+        parser.add_argument('-A','--shardall', action='store_true', default=False, help='LaTeX the list of all abstracts in pieces (one or more per subject or level, when sorted by that), in parallel and cached, then put the pieces together')
+        parser.add_argument('-B','--buildingpenalty', action='store', type=int, default=0, help='with -g, how many seats it is worth to keep a series of sessions, such as Statistics I and II, in one building; default: 0')
+        parser.add_argument('-b','--batch', action='store_true', default=False, help='LaTeX the abstracts together in one run (one per job), then split the result into separate pdfs')
+        parser.add_argument('-C','--check', action='store_true', default=False, help='check the schedule in the program against the abstracts, and the form of the abstracts, and stop')
+        parser.add_argument('-c','--cachedir', action='store', default=CACHE_DIR_NAME, help='directory holding the build cache; default: '+CACHE_DIR_NAME)
+        parser.add_argument('-d','--dumpprogram', action='store', default=None, help='write the parallel sessions of the program as JSON to this file (- for standard output)')
+        parser.add_argument('-e','--attendance', action='store', default=None, help='with -g, file of lines giving a session name and its expected attendance; otherwise the ranks in the comments of the session lines are used')
+        parser.add_argument('-F','--formats', action='store_true', default=False, help='dump the preamble of each template into a format once, and LaTeX with that')
         parser.add_argument('-f','--file', action='store', default=DEFAULT_PROGRAM_NAME,help='name of the .tex of the program for the conference; default: '+DEFAULT_PROGRAM_NAME)
+        parser.add_argument('-g','--assignrooms', action='store', default=None, help='assign rooms to the sessions of the program from this file of rooms and their capacities, like roomallocation.txt, write them into the program, and stop')
+        parser.add_argument('-H','--html', action='store', default=None, help='write the abstracts, the list of all of them, the rooms, and the schedule as HTML pages, with MathJax for the math, into this directory, without LaTeX, and stop (with -w, keep them up to date)')
+        parser.add_argument('-I','--indexstyle', action='store', default=None, help='with -P, the makeindex style file for the index of authors; default: none')
+        parser.add_argument('-j','--jobs', action='store', type=int, default=1, help='number of abstracts to LaTeX at the same time; 0 means one per CPU; default: 1')
+        parser.add_argument('-K','--pdfcrop', action='store_true', default=False, help='make each abstract on a full page and crop it with pdfcrop, instead of sizing the page to the abstract with the preview package')
+        parser.add_argument('-L','--lint', action='store_true', default=False, help='look for mistakes in the form of each abstract, such as a missing argument or unbalanced braces, and do not LaTeX those that have them')
+        parser.add_argument('-N','--nocheck', action='store_true', default=False, help='do not check the schedule before LaTeX-ing')
+        parser.add_argument('-n','--nocache', action='store_true', default=False, help='do not reuse or save already LaTeX-ed abstracts')
+        parser.add_argument('-o','--sort-by', action='store', choices=SORT_FIELDS, default='filename', help='order of the abstracts in the list of all abstracts; default: filename')
+        parser.add_argument('-P','--program', action='store_true', default=False, help='make the program document, with the abstracts and the index of authors, running pdflatex and makeindex only as often as needed, and stop')
         parser.add_argument('-p','--nopdfs', action='store_true', default=False, help='suppress generation of separate pdfs for each abstract')
         parser.add_argument('-r','--noroomlist', action='store_true', default=False, help='suppress the generation of information sheets for each room')
+        parser.add_argument('-w','--watch', action='store_true', default=False, help='after building, stay running and rebuild what is affected by each change to an abstract or to the program')
+        parser.add_argument('-W','--worker', action='store', default=None, help='be a worker: LaTeX the documents that coordinators send through this spool directory, until Ctrl-C')
+        parser.add_argument('-q','--query', action='append', default=[], help='list the abstracts with this field=value, such as level=2 or subject=statistics, and stop; give it more than once to narrow the list')
+        parser.add_argument('-R','--shardrooms', action='store_true', default=False, help='LaTeX each room separately, in parallel and cached, then put the rooms together')
+        parser.add_argument('-s','--scratch', action='store', default=SCRATCH_DIR_NAME, help='directory in which to make the scratch space for running LaTeX, such as /dev/shm; default: '+SCRATCH_DIR_NAME)
+        parser.add_argument('-t','--timeout', action='store', type=int, default=TIMEOUT_SECS, help='stop any one run of pdflatex, pdfcrop, etc., that takes longer than this many seconds; 0 means no limit; default: '+str(TIMEOUT_SECS))
+        parser.add_argument('-S','--spool', action='store', default=None, help='do not LaTeX here, but send the documents through this directory, on a filesystem shared with the workers, to hrumc.py --worker processes, and collect the results')
+        parser.add_argument('-T','--profile', action='store', default=None, help='time each step of making each document and write that, with the TeX log diagnostics, as JSON to this file')
         parser.add_argument('-v','--version', action='version', version='%(prog)s '+globals()['__version__'])
         parser.add_argument('-D', '--debug', action='store_true', default=False, help='run debugging code')
         parser.add_argument('-V', '--verbose', action='store_true', default=False, help='verbose output')
@@ -554,6 +3365,9 @@ if __name__ == '__main__':
             DEBUG = True
         if ('verbose' in args) and args['verbose']: 
             VERBOSE = True
+        if args['profile']:
+            PROFILE = Profile()
+        TIMEOUT = args['timeout'] or None
         main(args)
         if VERBOSE: 
             print('elapsed secs: ', "%0.2f" % (time.time()-start_time,))
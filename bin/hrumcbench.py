@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Time the stages of hrumc.py on made-up conferences of various sizes.  Each
+conference has some number of abstracts, in the format of jones1.tex, and
+a program whose parallel sessions schedule them all.  The timings are
+appended, one line of JSON per run, to a results file so that runs can be
+compared over time.
+"""
+__version__ = '1.0.0'
+__author__ = 'Jim Hefferon jhefferon at smcvt.edu'
+__license__ = 'GPL 3'
+
+import sys, os, os.path, argparse, traceback, time
+import tempfile, shutil, json, random, resource, platform, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import hrumc
+
+DEFAULT_SIZES = "60,130,260"  # number of abstracts
+DEFAULT_PARALLEL_SESSIONS = 3
+DEFAULT_SLOTS = 4  # talks per session
+DEFAULT_RESULTS_NAME = "hrumcbench.jsonl"
+STAGES = ('parse', 'each', 'all', 'rooms')
+PROGRAM_NAME = "hrumcbench.tex"
+
+VERBOSE = False
+DEBUG = False
+
+SUBJECTS = ["Abstract Algebra", "Analysis", "Applied Mathematics",
+            "Combinatorics", "Differential Equations", "Geometry",
+            "Graph Theory", "Knot Theory", "Number Theory", "Statistics",
+            "Theory of Computation", "Topology"]
+WORDS = ["elliptic", "curves", "graphs", "random", "walks", "on", "the",
+         "of", "finite", "groups", "knots", "primes", "a", "model", "for",
+         "simulation", "in", "R", "chaotic", "maps", "colorings", "tilings"]
+NAMES = ["Steve Jones", "Mark Smith", "Nanjiang Liu", "Ada Morse",
+         "Paul Friedman", "Amy Wehe", "Blair Madore", "Lucy Spardy"]
+SCHOOLS = ["UBC", "BCU", "St. Lawrence University", "Union College",
+           "Siena College", "Williams College", "Marist College"]
+
+ABSTRACT_TEMPLATE = r"""\abstract{%% title
+    %(title)s
+  }{%% authors
+    %(author)s, %(school)s
+  }{%% level
+    %(level)d}{%(subject)s}{%% abstract
+  %(body)s
+}
+"""
+
+PROGRAM_TEMPLATE_TOP = r"""%% Made by hrumcbench.py
+\documentclass{hrumc}
+\begin{document}
+
+% ===== BEGIN PARALLEL SESSIONS (leave this string; it is used by hrumc.py)
+"""
+PROGRAM_TEMPLATE_BOTTOM = r"""
+% ===== END PARALLEL SESSIONS (leave this string; it is used by hrumc.py)
+\end{document}
+"""
+
+
+def make_abstract(rng):
+    """Return the text of a made-up abstract.
+    """
+    title = " ".join(rng.choice(WORDS) for i in range(rng.randint(3,9))).capitalize()
+    sentences = []
+    for i in range(rng.randint(3,10)):
+        sentence = " ".join(rng.choice(WORDS) for j in range(rng.randint(6,18)))
+        if rng.random() < 0.3:
+            sentence += r" $\int_0^%d x^%d\,dx$" % (rng.randint(1,9), rng.randint(2,5))
+        sentences.append(sentence.capitalize()+".")
+    return ABSTRACT_TEMPLATE % {'title': title, 'author': rng.choice(NAMES),
+                                'school': rng.choice(SCHOOLS),
+                                'level': rng.randint(1,2),
+                                'subject': rng.choice(SUBJECTS),
+                                'body': "\n  ".join(sentences)}
+
+def make_conference(dirname, size, parallelsessions=DEFAULT_PARALLEL_SESSIONS, slots=DEFAULT_SLOTS, seed=0):
+    """Make a conference of size abstracts in dirname: the program
+    PROGRAM_NAME there, and the abstracts in dirname/input.  Returns the
+    number of rooms used.
+    """
+    rng = random.Random(seed)
+    inputdir = os.path.join(dirname,'input')
+    os.makedirs(inputdir, exist_ok=True)
+    keys = []
+    for n in range(size):
+        key = "abs%05d" % (n,)
+        f = open(os.path.join(inputdir,key+'.tex'),'w')
+        f.write(make_abstract(rng))
+        f.close()
+        keys.append(key)
+    # deal the talks into sessions
+    talks_per_parallelsession = -(-size // parallelsessions)  # round up
+    rooms = max(1, -(-talks_per_parallelsession // slots))
+    f = open(os.path.join(dirname,PROGRAM_NAME),'w')
+    f.write(PROGRAM_TEMPLATE_TOP)
+    for ps in range(parallelsessions):
+        print("\n\\sessionhead{%d}" % (ps+1,), file=f)
+        for room in range(rooms):
+            start = (ps*rooms+room)*slots
+            if start >= size:
+                break
+            print("\n\\session{%s %d.%d}{Room %d}{%s}" % (rng.choice(SUBJECTS), ps+1, room+1, room+1, rng.choice(NAMES)), file=f)
+            for slot, key in enumerate(keys[start:start+slots]):
+                hour, minute = divmod((9+2*ps)*60+20*slot, 60)
+                print(r"\at{%d:%02d}{%s}" % (hour, minute, key), file=f)
+    f.write(PROGRAM_TEMPLATE_BOTTOM)
+    f.close()
+    return rooms
+
+
+def time_stage(fcn, *args, **kwargs):
+    """Run the fcn and return a dict of its wall time and the CPU time of
+    this process and its children.
+    """
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    fcn(*args, **kwargs)
+    wall = time.perf_counter()-start
+    self_after = resource.getrusage(resource.RUSAGE_SELF)
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = ((self_after.ru_utime+self_after.ru_stime)
+           -(self_before.ru_utime+self_before.ru_stime))
+    children_cpu = ((children_after.ru_utime+children_after.ru_stime)
+                    -(children_before.ru_utime+children_before.ru_stime))
+    return {'wall': wall, 'cpu': cpu, 'children_cpu': children_cpu}
+
+def bench_conference(dirname, stages, jobs=1, batch=False):
+    """Time each of the stages on the conference in dirname.  Returns a map
+    from stage to its times.
+    """
+    conference = hrumc.ConferenceBuild(os.path.join(dirname,'input'),
+                                       programfn=os.path.join(dirname,PROGRAM_NAME),
+                                       outputdir=dirname,
+                                       pdfdir=os.path.join(dirname,'output'),
+                                       cache=False)  # so each repeat does the work
+    filelist = conference.filelist()
+    results = {}
+    for stage in stages:
+        if VERBOSE:
+            print("  Stage",stage+'.')
+        if stage == 'parse':
+            results[stage] = time_stage(conference.program)
+        elif stage == 'each':
+            results[stage] = time_stage(conference.abstracts, filelist, jobs=jobs, batch=batch)
+        elif stage == 'all':
+            results[stage] = time_stage(conference.all_abstracts, filelist)
+        elif stage == 'rooms':
+            results[stage] = time_stage(conference.rooms)
+    return results
+
+
+#==================================================================
+def main(args):
+    sizes = [int(n) for n in args['sizes'].split(',')]
+    stages = args['stages'].split(',')
+    for stage in stages:
+        if stage not in STAGES:
+            hrumc.error("unknown stage "+stage+"; the stages are "+", ".join(STAGES)+"\n")
+    if shutil.which('pdflatex') is None:
+        hrumc.warn("pdflatex not found; timing only the parse stage")
+        stages = [stage for stage in stages if stage == 'parse']
+    run = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+           'host': platform.node(),
+           'hrumc_version': hrumc.__version__,
+           'toolchain': hrumc.toolchain_version(),
+           'cpus': os.cpu_count(),
+           'jobs': args['jobs'], 'batch': args['batch'],
+           'parallelsessions': args['parallelsessions'], 'slots': args['slots'],
+           'results': []}
+    for size in sizes:
+        dirname = tempfile.mkdtemp(prefix='hrumcbench')
+        try:
+            rooms = make_conference(dirname, size, args['parallelsessions'], args['slots'], seed=args['seed'])
+            if VERBOSE:
+                print("Conference of",size,"abstracts in",rooms,"rooms, in",dirname+'.')
+            for repeat in range(args['repeat']):
+                times = bench_conference(dirname, stages, jobs=args['jobs'], batch=args['batch'])
+                run['results'].append({'abstracts': size, 'rooms': rooms,
+                                       'repeat': repeat, 'stages': times})
+                print("%5d abstracts: " % (size,)
+                      +"  ".join("%s %0.3fs" % (stage, times[stage]['wall']) for stage in stages))
+        finally:
+            if args['keep']:
+                print("  Kept",dirname)
+            else:
+                shutil.rmtree(dirname)
+    fout = open(args['output'],'a')
+    print(json.dumps(run), file=fout)
+    fout.close()
+    if VERBOSE:
+        print("Results appended to",args['output'])
+
+#==================================================================
+if __name__ == '__main__':
+    try:
+        start_time = time.time()
+        parser = argparse.ArgumentParser(description=globals()['__doc__'])
+        parser.add_argument('-b','--batch', action='store_true', default=False, help='LaTeX the abstracts in batches, as hrumc.py -b does')
+        parser.add_argument('-j','--jobs', action='store', type=int, default=1, help='number of abstracts to LaTeX at the same time; 0 means one per CPU; default: 1')
+        parser.add_argument('-k','--keep', action='store_true', default=False, help='keep the made-up conferences')
+        parser.add_argument('-m','--parallelsessions', action='store', type=int, default=DEFAULT_PARALLEL_SESSIONS, help='number of parallel sessions; default: '+str(DEFAULT_PARALLEL_SESSIONS))
+        parser.add_argument('-n','--sizes', action='store', default=DEFAULT_SIZES, help='comma-separated numbers of abstracts; default: '+DEFAULT_SIZES)
+        parser.add_argument('-o','--output', action='store', default=DEFAULT_RESULTS_NAME, help='file to append the results to; default: '+DEFAULT_RESULTS_NAME)
+        parser.add_argument('-r','--repeat', action='store', type=int, default=1, help='number of times to time each size; default: 1')
+        parser.add_argument('-s','--stages', action='store', default=",".join(STAGES), help='comma-separated stages to time; default: '+",".join(STAGES))
+        parser.add_argument('-S','--seed', action='store', type=int, default=0, help='seed for making up the conferences; default: 0')
+        parser.add_argument('-t','--slots', action='store', type=int, default=DEFAULT_SLOTS, help='number of talks in a session; default: '+str(DEFAULT_SLOTS))
+        parser.add_argument('-v','--version', action='version', version='%(prog)s '+globals()['__version__'])
+        parser.add_argument('-D', '--debug', action='store_true', default=False, help='run debugging code')
+        parser.add_argument('-V', '--verbose', action='store_true', default=False, help='verbose output')
+        args = parser.parse_args()
+        args = vars(args)
+        if ('debug' in args) and args['debug']:
+            DEBUG = hrumc.DEBUG = True
+        if ('verbose' in args) and args['verbose']:
+            VERBOSE = hrumc.VERBOSE = True
+        main(args)
+        if VERBOSE:
+            print('elapsed secs: ', "%0.2f" % (time.time()-start_time,))
+        sys.exit(0)
+    except KeyboardInterrupt as e: # Ctrl-C
+        raise e
+    except SystemExit as e: # sys.exit()
+        raise e
+    except Exception as e:
+        print('UNEXPECTED OUTCOME')
+        print(str(e))
+        traceback.print_exc()
+        os._exit(1)